@@ -0,0 +1,206 @@
+"""Content-addressed archive of every source a build used.
+
+Each payload is stored once under archive/objects by the sha256 of its
+body, so identical pages cost no extra space. Each build whose inputs
+changed writes a small run index mapping (source, season, week,
+fetched_at) to those hashes, which is enough to restore the exact inputs
+of any past build. The cache's LRU eviction leaves the archive alone, so
+every object a run index names is kept.
+"""
+
+import glob
+import gzip
+import json
+import os
+import time
+from os import path
+
+import fetch
+
+ARCHIVE_DIR = path.join("sources", "archive")
+
+
+def object_path(digest, directory=ARCHIVE_DIR):
+    """Return where the payload with sha256 digest is stored."""
+    return path.join(directory, "objects", digest[:2], digest + ".gz")
+
+
+def store(text, directory=ARCHIVE_DIR):
+    """Store a payload (if it is new) and return its sha256 digest."""
+    digest = fetch.checksum(text)
+    filename = object_path(digest, directory)
+    if not path.isfile(filename):
+        fetch.make_dirs([filename])
+        # write to a temp file first so a crash never leaves a partial object
+        tmp_file = "{}.{}.tmp".format(filename, os.getpid())
+        with gzip.open(tmp_file, "wt", encoding="utf-8", newline="") as outfile:
+            outfile.write(text)
+        os.replace(tmp_file, filename)
+    return digest
+
+
+def load(digest, directory=ARCHIVE_DIR):
+    """Return the payload stored under digest."""
+    with gzip.open(
+        object_path(digest, directory), "rt", encoding="utf-8", newline=""
+    ) as infile:
+        return infile.read()
+
+
+def archived_body(filename, directory=ARCHIVE_DIR):
+    """Archive the cached copy of filename (if it is new) and return its digest.
+
+    The manifest's sha256 is the object's key, so a body already archived
+    is neither read nor hashed again.
+    """
+    digest = fetch.read_manifest(filename).get("sha256")
+    if digest is not None and path.isfile(object_path(digest, directory)):
+        return digest
+    return store(fetch.read_cache(filename), directory)
+
+
+def last_run(season, week, directory=ARCHIVE_DIR):
+    """Return (index file, run) of the latest run for season/week, or (None, None)."""
+    # run ids are timestamps, so the names sort in run order
+    index_files = sorted(
+        glob.glob(path.join(directory, "runs", "{}_week{}_*.json".format(season, week)))
+    )
+    if not index_files:
+        return None, None
+    with open(index_files[-1], "r") as json_file:
+        return index_files[-1], json.load(json_file)
+
+
+def run_inputs(entries):
+    return {(entry["source"], entry["url"], entry["hash"]) for entry in entries}
+
+
+def snapshot(sources, season, week, directory=ARCHIVE_DIR):
+    """Archive the cached copy of every source and write the run index.
+
+    sources is a list of (filename, endpoint, ttl) as used by prefetch.
+    If the sources and their bodies are the same as in the latest run for
+    season/week, no index is written. Returns the path of the run index.
+    """
+    entries = []
+    for filename, endpoint, _ in sources:
+        if not fetch.is_cached(filename):
+            continue
+        manifest = fetch.read_manifest(filename)
+        entries.append(
+            {
+                "source": filename,
+                "url": endpoint,
+                "season": season,
+                "week": week,
+                "fetched_at": manifest.get("fetched_at")
+                or path.getmtime(fetch.cache_path(filename)),
+                "hash": archived_body(filename, directory),
+            }
+        )
+
+    previous, run = last_run(season, week, directory)
+    if run is not None and run_inputs(run["entries"]) == run_inputs(entries):
+        print("Archive: {} sources unchanged since [{}]".format(len(entries), previous))
+        return previous
+
+    created_at = time.time()
+    run_id = time.strftime("%Y%m%dT%H%M%S", time.gmtime(created_at))
+    index_file = path.join(
+        directory, "runs", "{}_week{}_{}.json".format(season, week, run_id)
+    )
+    fetch.make_dirs([index_file])
+    with open(index_file, "w") as outfile:
+        json.dump(
+            {
+                "run_id": run_id,
+                "season": season,
+                "week": week,
+                "created_at": created_at,
+                "entries": entries,
+            },
+            outfile,
+            indent=2,
+        )
+
+    print("Archive: {} sources in run [{}]".format(len(entries), index_file))
+    return index_file
+
+
+def restore(index_file, directory=ARCHIVE_DIR):
+    """Write the sources recorded in a run index back into the cache.
+
+    The restored entries keep their original fetched_at, so a build run
+    afterwards sees exactly the inputs of the archived run.
+    """
+    with open(index_file, "r") as json_file:
+        run = json.load(json_file)
+
+    for entry in run["entries"]:
+        filename = entry["source"]
+        fetch.make_dirs([filename])
+        fetch.write_cache(filename, load(entry["hash"], directory))
+        fetch.write_manifest(
+            filename,
+            {
+                "url": entry["url"],
+                "fetched_at": entry["fetched_at"],
+                "etag": None,
+                "last_modified": None,
+                "sha256": entry["hash"],
+            },
+        )
+
+    print(
+        "Archive: restored {} sources from [{}]".format(len(run["entries"]), index_file)
+    )
+    return run
+
+
+def latest(filename, directory=ARCHIVE_DIR):
+    """Return the most recently fetched archived entry for filename, or None."""
+    found = None
+    for index_file in glob.glob(path.join(directory, "runs", "*.json")):
+        with open(index_file, "r") as json_file:
+            run = json.load(json_file)
+        for entry in run["entries"]:
+            if entry["source"] != filename:
+                continue
+            # the object may have been evicted from the cache
+            if not path.isfile(object_path(entry["hash"], directory)):
+                continue
+            if found is None or entry["fetched_at"] > found["fetched_at"]:
+                found = entry
+    return found
+
+
+def restore_missing(sources, directory=ARCHIVE_DIR):
+    """Fill in sources that are not cached with their latest archived copy.
+
+    sources is a list of (filename, endpoint, ttl). Returns the filenames
+    that were restored; ones never archived are left missing.
+    """
+    restored = []
+    for filename, endpoint, _ in sources:
+        if fetch.is_cached(filename):
+            continue
+        entry = latest(filename, directory)
+        if entry is None:
+            print("Archive: no copy of [{}] to fall back on".format(filename))
+            continue
+        fetch.make_dirs([filename])
+        fetch.write_cache(filename, load(entry["hash"], directory))
+        fetch.write_manifest(
+            filename,
+            {
+                "url": endpoint,
+                "fetched_at": entry["fetched_at"],
+                "etag": None,
+                "last_modified": None,
+                "sha256": entry["hash"],
+            },
+        )
+        fetched = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["fetched_at"]))
+        print("Archive: falling back on [{}] fetched {}".format(filename, fetched))
+        restored.append(filename)
+    return restored
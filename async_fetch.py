@@ -0,0 +1,156 @@
+"""Asyncio backend for fetching sources without blocking the event loop."""
+
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import fetch
+
+# never hit a single host with more than this many parallel requests
+PER_HOST_LIMIT = 2
+
+# requests in flight across all hosts
+MAX_IN_FLIGHT = 8
+
+
+class AsyncFetcher:
+    """Fetch and load sources from a running event loop.
+
+    Blocking work (requests through the shared session, file reads and
+    parsing) runs in the loop's executor, so other tasks keep running.
+    Requests are limited per host and globally by semaphores.
+    """
+
+    def __init__(self, per_host=PER_HOST_LIMIT, max_in_flight=MAX_IN_FLIGHT):
+        self.per_host = per_host
+        self.max_in_flight = max_in_flight
+        self.hosts = {}
+        self.in_flight = None
+
+    def __repr__(self):
+        return "AsyncFetcher(per_host={}, max_in_flight={})".format(
+            self.per_host, self.max_in_flight
+        )
+
+    def host_limit(self, endpoint):
+        """Return the semaphore for the host of endpoint."""
+        host = urlparse(endpoint).netloc
+        if host not in self.hosts:
+            self.hosts[host] = asyncio.Semaphore(self.per_host)
+        return self.hosts[host]
+
+    async def run(self, func, *args, **kwargs):
+        """Run a blocking function in the loop's executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(func, *args, **kwargs)
+        )
+
+    async def revalidate(self, filename, endpoint):
+        """Async version of fetch.fill, bounded per host and globally."""
+        if self.in_flight is None:
+            self.in_flight = asyncio.Semaphore(self.max_in_flight)
+
+        # wait for the host first so we don't hold a global slot while queued
+        async with self.host_limit(endpoint):
+            async with self.in_flight:
+                return await self.run(fetch.fill, filename, endpoint)
+
+    async def ensure_cached(self, filename, endpoint, refresh=False, ttl=None):
+        """Pull endpoint into filename if it is missing, revalidate it if stale."""
+        if not fetch.is_cached(filename):
+            print("Pulling [{}] from endpoint [{}]".format(filename, endpoint))
+            await self.revalidate(filename, endpoint)
+        elif refresh or fetch.is_stale(filename, ttl):
+            if fetch.STALE_WHILE_REVALIDATE and not refresh:
+                print(
+                    "Serving stale [{}], refreshing in the background".format(filename)
+                )
+                fetch.refresh_in_background(filename, endpoint)
+            elif fetch.past_deadline():
+                print("Deadline passed, using cached [{}]".format(filename))
+            else:
+                print("Revalidating [{}] against [{}]".format(filename, endpoint))
+                try:
+                    await self.revalidate(filename, endpoint)
+                except fetch.DeadlineExceeded as ex:
+                    print("{}, using cached [{}]".format(ex, filename))
+
+    async def pull_data(self, filename, endpoint, refresh=False, ttl=None):
+        """Async version of fetch.pull_data."""
+        await self.ensure_cached(filename, endpoint, refresh, ttl)
+        return await self.run(fetch.read_json, filename)
+
+    async def pull_soup_data(self, filename, endpoint, refresh=False, ttl=None):
+        """Async version of fetch.pull_soup_data."""
+        await self.ensure_cached(filename, endpoint, refresh, ttl)
+        return await self.run(fetch.read_soup, filename)
+
+    async def load_source(self, source, directory="sources", **params):
+        """Async version of fetch.load_source."""
+        filename = source.cache_file(directory, **params)
+        await self.ensure_cached(filename, source.endpoint(**params), ttl=source.ttl)
+        return await self.run(fetch.parse_source, source, filename, params)
+
+    async def timed_revalidate(self, filename, endpoint):
+        start = time.perf_counter()
+        await self.revalidate(filename, endpoint)
+        return time.perf_counter() - start
+
+    async def prefetch(self, sources):
+        """Async version of fetch.prefetch."""
+        missing = fetch.sources_to_fetch(sources)
+        if not missing:
+            print("Prefetch: all {} sources are fresh.".format(len(sources)))
+            return {}
+
+        fetch.make_dirs(fn for fn, _ in missing)
+
+        start = time.perf_counter()
+        tasks = [
+            asyncio.ensure_future(self.timed_revalidate(fn, url)) for fn, url in missing
+        ]
+        # stop waiting at the build deadline, if there is one
+        _, pending = await asyncio.wait(tasks, timeout=fetch.time_left())
+        for task in pending:
+            task.cancel()
+
+        timings = {}
+        for (_, url), task in zip(missing, tasks):
+            if task in pending:
+                print("Prefetch: deadline passed for [{}]".format(url))
+            elif task.exception() is not None:
+                print("Prefetch: failed [{}]: {}".format(url, task.exception()))
+            else:
+                timings[url] = task.result()
+                print("Prefetch: {:6.2f}s [{}]".format(timings[url], url))
+
+        print(
+            "Prefetch: {} of {} sources in {:.2f}s".format(
+                len(timings), len(missing), time.perf_counter() - start
+            )
+        )
+        return timings
+
+
+async def prefetch_async(sources, per_host=PER_HOST_LIMIT, max_in_flight=MAX_IN_FLIGHT):
+    """Run AsyncFetcher.prefetch on the running loop."""
+    return await AsyncFetcher(per_host, max_in_flight).prefetch(sources)
+
+
+def prefetch(sources, per_host=PER_HOST_LIMIT, max_in_flight=MAX_IN_FLIGHT):
+    """Run AsyncFetcher.prefetch to completion from blocking code.
+
+    Called while an event loop is running in this thread (e.g. from a
+    notebook), it runs on a new loop in a worker thread instead; async
+    code should await prefetch_async rather than block its loop.
+    """
+    coro = prefetch_async(sources, per_host, max_in_flight)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
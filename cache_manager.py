@@ -0,0 +1,271 @@
+"""Least-recently-used eviction for the sources cache.
+
+The manager keeps the size and last access time of every cache entry in
+an index, and once the entries add up to more than max_bytes it removes
+the least recently used ones. The index is an append-only log, so an
+access costs one appended line rather than a rewrite, and a heap of
+(access time, key) finds the next entry to evict in O(log n). Heap items
+made obsolete by a later access are skipped when popped (lazy deletion).
+
+Pinned entries are never evicted. pin() is stored in the index (e.g. for
+a source someone wants to keep however old it gets), keep() lasts until
+release() or the end of this process (e.g. the sources of the slate
+being built).
+
+Several processes can share an index. Every read and write of it is made
+while holding the index lock, and each process replays the lines the
+others appended before it writes, so its totals (and evictions) account
+for every process's entries.
+"""
+
+import heapq
+import os
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+from os import path
+
+
+class CacheManager:
+    """Track cache entries in index_file and keep them under max_bytes.
+
+    remove(key) is called to delete an evicted entry from disk. Keys are
+    usually file paths. A new index can be filled with seed(). lock() is
+    a context manager holding the index against other processes (e.g.
+    an flock); without one the index is only safe within one process.
+    """
+
+    def __init__(self, index_file, max_bytes=None, remove=None, lock=None):
+        self.index_file = index_file
+        self.max_bytes = max_bytes
+        self.remove = remove or os.remove
+        self.index_lock = lock or nullcontext
+        self.kept = set()
+        self.lock = threading.Lock()
+        self.reset()
+
+        with self.index_lock():
+            self.sync()
+
+    def __repr__(self):
+        return "CacheManager({} entries, {} bytes, max_bytes={})".format(
+            len(self.entries), self.total, self.max_bytes
+        )
+
+    def reset(self):
+        """Forget everything read from the index (but not what is kept)."""
+        self.entries = {}
+        self.heap = []
+        self.pinned = set()
+        self.total = 0
+        self.lines = 0
+        # the index file we read (its stat) and how far into it
+        self.stat = None
+        self.offset = 0
+
+    def sync(self):
+        """Replay the lines appended to the index since it was last read.
+
+        Must be called with the index lock held. If another process
+        compacted the index meanwhile, all of it is read again.
+        """
+        try:
+            stat = os.stat(self.index_file)
+        except FileNotFoundError:
+            stat = None
+        if stat is None or self.stat is None or not path.samestat(stat, self.stat):
+            self.reset()
+        self.stat = stat
+        if stat is None or stat.st_size == self.offset:
+            return
+
+        with open(self.index_file, "rb") as infile:
+            infile.seek(self.offset)
+            for line in infile:
+                if not line.endswith(b"\n"):
+                    # cut short by a crash; append() compacts it away
+                    break
+                self.offset += len(line)
+                self.replay(line[:-1].decode("utf-8"))
+
+    def replay(self, line):
+        self.lines += 1
+        op, _, rest = line.partition(" ")
+        if op == "T":
+            size, atime, key = rest.split(" ", 2)
+            self.set_entry(key, int(size), float(atime))
+            heapq.heappush(self.heap, (float(atime), key))
+        elif op == "D":
+            self.drop_entry(rest)
+        elif op == "P":
+            self.pinned.add(rest)
+        elif op == "U":
+            self.pinned.discard(rest)
+            self.requeue(rest)
+
+    def seed(self, entries):
+        """Add (key, size, atime) for entries that exist but were never indexed."""
+        with self.lock, self.index_lock():
+            self.sync()
+            for key, size, atime in entries:
+                if key not in self.entries:
+                    self.set_entry(key, size, atime)
+                    heapq.heappush(self.heap, (atime, key))
+            self.write_index()
+            return self.evict()
+
+    def compact(self):
+        """Rewrite the index log with one line per live entry and pin."""
+        with self.lock, self.index_lock():
+            self.sync()
+            self.write_index()
+
+    def write_index(self):
+        # must be called with both locks held, right after sync()
+        fd, tmp_file = tempfile.mkstemp(
+            dir=path.dirname(self.index_file) or ".",
+            prefix=path.basename(self.index_file) + ".",
+            suffix=".tmp",
+        )
+        with os.fdopen(fd, "w", encoding="utf-8") as outfile:
+            for key, (size, atime) in self.entries.items():
+                print("T {} {} {}".format(size, atime, key), file=outfile)
+            for key in self.pinned:
+                print("P {}".format(key), file=outfile)
+        os.replace(tmp_file, self.index_file)
+        self.stat = os.stat(self.index_file)
+        self.offset = self.stat.st_size
+        self.lines = len(self.entries) + len(self.pinned)
+
+    def append(self, *lines):
+        """Append to the index, compacting it once it is mostly dead lines.
+
+        Must be called with both locks held, after sync() and the changes
+        the lines record.
+        """
+        partial = self.stat is not None and self.stat.st_size != self.offset
+        if partial or self.lines > 2 * (len(self.entries) + len(self.pinned)) + 100:
+            # the index already holds the changes once it is rewritten
+            self.write_index()
+            return
+        with open(self.index_file, "a", encoding="utf-8") as outfile:
+            for line in lines:
+                print(line, file=outfile)
+        self.stat = os.stat(self.index_file)
+        self.offset = self.stat.st_size
+        self.lines += len(lines)
+
+    def set_entry(self, key, size, atime):
+        if key in self.entries:
+            self.total -= self.entries[key][0]
+        self.entries[key] = (size, atime)
+        self.total += size
+
+    def drop_entry(self, key):
+        if key in self.entries:
+            self.total -= self.entries.pop(key)[0]
+
+    def touch(self, key, size=None):
+        """Record an access to key; pass size when the entry was (re)written.
+
+        Returns the keys evicted to make room.
+        """
+        with self.lock, self.index_lock():
+            self.sync()
+            if size is None:
+                if key not in self.entries:
+                    return []
+                size = self.entries[key][0]
+            atime = time.time()
+            self.set_entry(key, size, atime)
+            heapq.heappush(self.heap, (atime, key))
+            self.append("T {} {} {}".format(size, atime, key))
+
+            # drop obsolete heap items once they outnumber live ones
+            if len(self.heap) > 2 * len(self.entries) + 64:
+                self.heap = [(t, k) for k, (_, t) in self.entries.items()]
+                heapq.heapify(self.heap)
+
+            return self.evict(protect=key)
+
+    def forget(self, key):
+        """Stop tracking key (after it was removed some other way)."""
+        with self.lock, self.index_lock():
+            self.sync()
+            if key in self.entries:
+                self.drop_entry(key)
+                self.append("D {}".format(key))
+
+    def evict(self, protect=None):
+        """Remove least recently used entries until the cache fits max_bytes.
+
+        Must be called with both locks held, after sync(), so the total
+        counts every process's entries. Returns the evicted keys.
+        """
+        evicted = []
+        if self.max_bytes is None:
+            return evicted
+
+        skipped = []
+        while self.total > self.max_bytes and self.heap:
+            atime, key = heapq.heappop(self.heap)
+            entry = self.entries.get(key)
+            if entry is None or entry[1] != atime:
+                # superseded by a later access, or already gone
+                continue
+            if key == protect or key in self.pinned or key in self.kept:
+                # pinned entries go back in the heap if they are unpinned
+                if key == protect:
+                    skipped.append((atime, key))
+                continue
+            try:
+                self.remove(key)
+            except FileNotFoundError:
+                pass
+            self.drop_entry(key)
+            evicted.append(key)
+
+        for item in skipped:
+            heapq.heappush(self.heap, item)
+
+        if evicted:
+            self.append(*("D {}".format(key) for key in evicted))
+            print(
+                "Cache: evicted {} entries, {} bytes in use".format(
+                    len(evicted), self.total
+                )
+            )
+        return evicted
+
+    def pin(self, key):
+        """Never evict key, across runs."""
+        with self.lock, self.index_lock():
+            self.sync()
+            if key not in self.pinned:
+                self.pinned.add(key)
+                self.append("P {}".format(key))
+
+    def unpin(self, key):
+        with self.lock, self.index_lock():
+            self.sync()
+            if key in self.pinned:
+                self.pinned.discard(key)
+                self.append("U {}".format(key))
+                self.requeue(key)
+
+    def keep(self, keys):
+        """Never evict keys while this process runs (e.g. the current slate)."""
+        with self.lock:
+            self.kept.update(keys)
+
+    def release(self, keys):
+        with self.lock:
+            for key in keys:
+                self.kept.discard(key)
+                self.requeue(key)
+
+    def requeue(self, key):
+        # pinned entries may have been dropped from the heap while pinned
+        if key in self.entries and key not in self.pinned and key not in self.kept:
+            heapq.heappush(self.heap, (self.entries[key][1], key))
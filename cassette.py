@@ -0,0 +1,171 @@
+"""Record HTTP traffic to a cassette file and replay it without a network.
+
+Everything fetched through fetch.get (pull_data, pull_soup_data, prefetch,
+the asyncio backend) goes through the shared session, so swapping that
+session is enough to capture or serve every request a build makes.
+
+    with cassette.record("week11.json"):
+        player_dfs_sheet.main()
+
+    with cassette.replay("week11.json", latency=True):
+        player_dfs_sheet.main()
+
+Replay only sees requests for sources that are missing or stale, so run
+it against an empty sources directory to exercise the whole fetch path.
+"""
+
+import argparse
+import importlib
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+import fetch
+
+
+class RecordingSession:
+    """Wrap a session and keep every response it returns."""
+
+    def __init__(self, session):
+        self.session = session
+        self.interactions = []
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return "RecordingSession({} interactions)".format(len(self.interactions))
+
+    def get(self, url, headers=None, timeout=None):
+        start = time.perf_counter()
+        response = self.session.get(url, headers=headers, timeout=timeout)
+        latency = time.perf_counter() - start
+
+        # the headers actually sent include the session defaults
+        sent = dict(self.session.headers)
+        sent.update(headers or {})
+        with self.lock:
+            self.interactions.append(
+                {
+                    "method": "GET",
+                    "url": url,
+                    "request_headers": sent,
+                    "status": response.status_code,
+                    "reason": response.reason,
+                    "headers": dict(response.headers),
+                    "body": response.text,
+                    "latency": latency,
+                }
+            )
+        return response
+
+
+class ReplaySession:
+    """Answer requests from recorded interactions instead of the network.
+
+    Interactions for the same URL are served in the order they were
+    recorded, the last one repeating once the others are used up.
+    """
+
+    def __init__(self, interactions, latency=False, speed=1.0):
+        self.latency = latency
+        self.speed = speed
+        self.queues = {}
+        for interaction in interactions:
+            key = (interaction["method"], interaction["url"])
+            self.queues.setdefault(key, []).append(interaction)
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return "ReplaySession({} urls)".format(len(self.queues))
+
+    def get(self, url, headers=None, timeout=None):
+        with self.lock:
+            queue = self.queues.get(("GET", url))
+            if not queue:
+                raise Exception("No recorded response for [{}]".format(url))
+            interaction = queue.pop(0) if len(queue) > 1 else queue[0]
+
+        if self.latency:
+            time.sleep(interaction["latency"] / self.speed)
+        return build_response(url, interaction)
+
+
+def build_response(url, interaction):
+    """Turn a recorded interaction into a requests.Response."""
+    response = requests.Response()
+    response.url = url
+    response.status_code = interaction["status"]
+    response.reason = interaction.get("reason")
+    response.headers = CaseInsensitiveDict(interaction["headers"])
+    # the body was recorded decoded, so drop the transfer encoding
+    response.headers.pop("Content-Encoding", None)
+    response.encoding = "utf-8"
+    response._content = interaction["body"].encode("utf-8")
+    return response
+
+
+def load(filename):
+    """Return the interactions stored in a cassette file."""
+    with open(filename, "r") as json_file:
+        return json.load(json_file)["interactions"]
+
+
+def save(filename, interactions):
+    """Write interactions to a cassette file."""
+    with open(filename, "w") as outfile:
+        json.dump({"version": 1, "interactions": interactions}, outfile, indent=2)
+
+
+@contextmanager
+def record(filename):
+    """Record every request made inside the block to filename."""
+    recorder = RecordingSession(fetch.get_session())
+    previous = fetch.set_session(recorder)
+    try:
+        yield recorder
+    finally:
+        fetch.set_session(previous)
+        save(filename, recorder.interactions)
+        print(
+            "Cassette: recorded {} requests to [{}]".format(
+                len(recorder.interactions), filename
+            )
+        )
+
+
+@contextmanager
+def replay(filename, latency=False, speed=1.0):
+    """Serve every request made inside the block from filename.
+
+    With latency, each response is delayed by its recorded latency
+    divided by speed.
+    """
+    player = ReplaySession(load(filename), latency, speed)
+    previous = fetch.set_session(player)
+    try:
+        yield player
+    finally:
+        fetch.set_session(previous)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record or replay a build.")
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("cassette")
+    parser.add_argument("--module", default="player_dfs_sheet")
+    parser.add_argument("--latency", action="store_true")
+    parser.add_argument("--speed", type=float, default=1.0)
+    args = parser.parse_args()
+
+    module = importlib.import_module(args.module)
+    start = time.perf_counter()
+    if args.mode == "record":
+        with record(args.cassette):
+            module.main()
+    else:
+        with replay(args.cassette, args.latency, args.speed):
+            module.main()
+    print("Cassette: {} took {:.2f}s".format(args.mode, time.perf_counter() - start))
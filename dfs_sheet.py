@@ -1,16 +1,16 @@
 """Create DFS spreadsheet from stats """
 
 import csv
-import json
 from os import makedirs, path
 
-import requests
-from bs4 import BeautifulSoup
 from openpyxl import Workbook
 from openpyxl.formatting.rule import ColorScaleRule
 from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
 from openpyxl.utils import get_column_letter
 
+from fetch import pull_data, pull_soup_data
+from tables import TableSpec, header_rows, number
+
 
 def style_range(
     worksheet, cell_range, border=Border(), fill=None, font=None, alignment=None
@@ -58,78 +58,6 @@ def create_sheet_header(workbook, title, header):
     workbook[title].append(header)
 
 
-def pull_data(filename, endpoint):
-    """Either pull file from API or from file."""
-    data = None
-    if not path.isfile(filename):
-        print(
-            "{} does not exist. Pulling from endpoint [{}]".format(filename, endpoint)
-        )
-        # send GET request
-        response = requests.get(endpoint)
-        status = response.status_code
-
-        # if not successful, raise an exception
-        if status != 200:
-            raise Exception("Requests status != 200. It is: {0}".format(status))
-
-        # store response
-        data = response.json()
-
-        # dump json to file for future use to avoid multiple API pulls
-        with open(filename, "w") as outfile:
-            json.dump(data, outfile)
-    else:
-        print("File exists [{}]. Nice!".format(filename))
-        # load json from file
-        with open(filename, "r") as json_file:
-            data = json.load(json_file)
-
-    return data
-
-
-def pull_soup_data(filename, endpoint):
-    """Either pull file from html or from file."""
-    soup = None
-    if not path.isfile(filename):
-        print(
-            "{} does not exist. Pulling from endpoint [{}]".format(filename, endpoint)
-        )
-        headers = {
-            "Accept": "*/*",
-            "Accept-Encoding": "gzip, deflate, sdch",
-            "Accept-Language": "en-US,en;q=0.8",
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "Pragma": "no-cache",
-            "User-Agent": (
-                "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_10_5) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/48.0.2564.97 Safari/537.36"
-            ),
-        }
-        # send GET request
-        response = requests.get(endpoint, headers=headers)
-        status = response.status_code
-
-        # if not successful, raise an exception
-        if status != 200:
-            raise Exception("Requests status != 200. It is: {0}".format(status))
-
-        # dump html to file to avoid multiple requests
-        with open(filename, "w") as outfile:
-            print(response.text, file=outfile)
-
-        soup = BeautifulSoup(response.text, "html5lib")
-    else:
-        print("File exists [{}]. Nice!".format(filename))
-        # load html from file
-        with open(filename, "r") as html_file:
-            soup = BeautifulSoup(html_file, "html5lib")
-
-    return soup
-
-
 def get_nfl_snaps(workbook):
     """Retrieve snaps from lineups.com API."""
     endpoint = "https://api.lineups.com/nfl/fetch/snaps/2018/OFF"
@@ -485,16 +413,16 @@ def get_nfl_def_stats(workbook):
         pass_yds = data["passing_yards"]
         pass_tds = data["passing_touchdowns"]
 
-        # personal
+        # personal (fractions)
         try:
-            pass_td_per_att = "{0:.4f}".format(pass_tds / pass_att)
+            pass_td_per_att = pass_tds / pass_att
         except ZeroDivisionError:
-            pass_td_per_att = "{0:.4f}".format(0)
+            pass_td_per_att = 0.0
 
         try:
-            compl_perc = "{0:.4f}".format(pass_compls / pass_att)
+            compl_perc = pass_compls / pass_att
         except ZeroDivisionError:
-            compl_perc = "{0:.4f}".format(0)
+            compl_perc = 0.0
 
         # remove '.' from name
         # name = name.replace('.', '')
@@ -652,6 +580,30 @@ def get_vegas_ows(workbook):
         )
 
 
+# every row of a table as a list of its cells, numbers converted
+ROWS_TABLE = TableSpec(convert=number)
+
+
+def ecr_name(cell):
+    # remove periods (T.J. Yeldon, T.Y. Hilton)
+    return cell.find(class_="full-name").text.replace(".", "")
+
+
+def fix_ecr_team(txt):
+    # replace JAX
+    return txt.replace("JAC", "JAX")
+
+
+def fix_qb_ecr_text(txt):
+    # really? just to fix mitchell?
+    return fix_ecr_team(txt).replace("Mitch", "Mitchell")
+
+
+# the player name is column 2
+ECR_TABLE = TableSpec(text=fix_ecr_team, readers={2: ecr_name}, convert=number)
+QB_ECR_TABLE = TableSpec(text=fix_qb_ecr_text, readers={2: ecr_name}, convert=number)
+
+
 def get_dvoa_rankings(workbook):
     endpoint = "https://www.footballoutsiders.com/stats/teamdef"
     filename = "html_defense.html"
@@ -671,22 +623,12 @@ def get_dvoa_rankings(workbook):
 
         defense_stats = table[0]
 
-        # find header
-        table_header = defense_stats.find("thead")
         # there is one header row
-        header_row = table_header.find("tr")
-        # loop through header columns and append to worksheet
-        header_cols = header_row.find_all("th")
-        header = [ele.text.strip() for ele in header_cols]
-        workbook[title].append(header)
+        workbook[title].append(header_rows(defense_stats)[0])
 
         # find the rest of the table header_rows
-        rows = defense_stats.find_all("tr")
-        for row in rows:
-            cols = row.find_all("td")
-            cols = [ele.text.strip() for ele in cols]
-            if cols:
-                workbook[title].append(cols)
+        for cols in ROWS_TABLE.extract(defense_stats):
+            workbook[title].append(cols)
 
         # separate function for second table
         get_dvoa_recv_rankings(workbook, table[1], title)
@@ -695,16 +637,12 @@ def get_dvoa_rankings(workbook):
 def get_dvoa_recv_rankings(workbook, soup_table, title):
     # VS types of receivers
     def_recv_stats = soup_table
-    table_header = def_recv_stats.find("thead")
-    header_rows = table_header.find_all("tr")
 
     # style for merge + center
     alignment = Alignment(horizontal="center", vertical="center")
 
     # there are two header rows
-    for i, row in enumerate(header_rows):
-        header_cols = row.find_all("th")
-        header = [ele.text.strip() for ele in header_cols]
+    for i, header in enumerate(header_rows(def_recv_stats)):
         # first header row has some merged cells
         if i == 0:
             # merge + center
@@ -732,12 +670,8 @@ def get_dvoa_recv_rankings(workbook, soup_table, title):
         # create_sheet_header(workbook, title, header)
         # print(header)
 
-    rows = def_recv_stats.find_all("tr")
-    for row in rows:
-        cols = row.find_all("td")
-        cols = [ele.text.strip() for ele in cols]
-        if cols:
-            workbook[title].append(cols)
+    for cols in ROWS_TABLE.extract(def_recv_stats):
+        workbook[title].append(cols)
 
 
 def get_oline_rankings(workbook):
@@ -759,22 +693,12 @@ def get_oline_rankings(workbook):
 
         oline_stats = table[0]
 
-        # find header
-        table_header = oline_stats.find("thead")
         # there is one header row
-        header_row = table_header.find("tr")
-        # loop through header columns and append to worksheet
-        header_cols = header_row.find_all("th")
-        header = [ele.text.strip() for ele in header_cols]
-        workbook[title].append(header)
+        workbook[title].append(header_rows(oline_stats)[0])
 
         # find the rest of the table header_rows
-        rows = oline_stats.find_all("tr")
-        for row in rows:
-            cols = row.find_all("td")
-            cols = [ele.text.strip() for ele in cols]
-            if cols:
-                workbook[title].append(cols)
+        for cols in ROWS_TABLE.extract(oline_stats):
+            workbook[title].append(cols)
 
 
 def get_dline_rankings(workbook):
@@ -796,22 +720,12 @@ def get_dline_rankings(workbook):
 
         oline_stats = table[0]
 
-        # find header
-        table_header = oline_stats.find("thead")
         # there is one header row
-        header_row = table_header.find("tr")
-        # loop through header columns and append to worksheet
-        header_cols = header_row.find_all("th")
-        header = [ele.text.strip() for ele in header_cols]
-        workbook[title].append(header)
+        workbook[title].append(header_rows(oline_stats)[0])
 
         # find the rest of the table header_rows
-        rows = oline_stats.find_all("tr")
-        for row in rows:
-            cols = row.find_all("td")
-            cols = [ele.text.strip() for ele in cols]
-            if cols:
-                workbook[title].append(cols)
+        for cols in ROWS_TABLE.extract(oline_stats):
+            workbook[title].append(cols)
 
 
 def get_qb_stats_outsiders(workbook):
@@ -834,22 +748,12 @@ def get_qb_stats_outsiders(workbook):
         for table in tables:
             qb_stats = table
 
-            # find header
-            table_header = qb_stats.find("thead")
             # there is one header row
-            header_row = table_header.find("tr")
-            # loop through header columns and append to worksheet
-            header_cols = header_row.find_all("th")
-            header = [ele.text.strip() for ele in header_cols]
-            workbook[title].append(header)
+            workbook[title].append(header_rows(qb_stats)[0])
 
             # find the rest of the table header_rows
-            rows = qb_stats.find_all("tr")
-            for row in rows:
-                cols = row.find_all("td")
-                cols = [ele.text.strip() for ele in cols]
-                if cols:
-                    workbook[title].append(cols)
+            for cols in ROWS_TABLE.extract(qb_stats):
+                workbook[title].append(cols)
 
 
 def fpros_ecr(workbook, position):
@@ -877,40 +781,27 @@ def fpros_ecr(workbook, position):
         title = "{0}_ECR".format(position)
         workbook.create_sheet(title=title)
 
-        # # find header
-        table_header = table.find("thead")
         # there is one header row
-        header_row = table_header.find("tr")
-        # loop through header columns and append to worksheet
-        header_cols = header_row.find_all("th")
-        header = [ele.text.strip() for ele in header_cols]
-        workbook[title].append(header)
+        workbook[title].append(header_rows(table)[0])
 
         # find the rest of the table header_rows
-        rows = table.find_all("tr")
-        for row in rows:
-            cols = row.find_all("td")
-            # cols = [ele.text.strip() for ele in cols]
-            # change from list comp for just fpros
-            new_cols = []
-            for i, ele in enumerate(cols):
-
-                if i == 2:  # name of player
-                    txt = ele.find(class_="full-name").text
-
-                    # remove periods (T.J. Yeldon, T.Y. Hilton)
-                    txt = txt.replace(".", "")
-                else:
-                    txt = ele.text.strip()
-                # replace JAX
-                txt = txt.replace("JAC", "JAX")
-
-                # really? just to fix mitchell?
-                if position == "QB":
-                    txt = txt.replace("Mitch", "Mitchell")
-                new_cols.append(txt)
-            if new_cols:
-                workbook[title].append(new_cols)
+        spec = QB_ECR_TABLE if position == "QB" else ECR_TABLE
+        for cols in spec.extract(table):
+            workbook[title].append(cols)
+
+
+# every html page read through pull_soup_data, as (cache file, function,
+# its arguments after the workbook), for parser_parity.py
+SOUP_PAGES = [
+    (path.join("sources", "ecr_{}.html".format(pos)), fpros_ecr, (pos,))
+    for pos in ["QB", "RB", "WR", "TE", "DST"]
+] + [
+    (path.join("sources", "vegas_script.html"), get_vegas_ows, ()),
+    (path.join("sources", "html_defense.html"), get_dvoa_rankings, ()),
+    (path.join("sources", "html_oline.html"), get_oline_rankings, ()),
+    (path.join("sources", "html_dline.html"), get_dline_rankings, ()),
+    (path.join("sources", "html_qb.html"), get_qb_stats_outsiders, ()),
+]
 
 
 def position_tab(workbook, values, title, fdraft_dict=None):
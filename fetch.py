@@ -0,0 +1,1402 @@
+"""Fetch remote sources and keep them cached in the sources directory."""
+
+import ast
+import glob
+import gzip
+import hashlib
+import json
+import lzma
+import multiprocessing
+import os
+import pickle
+import random
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    TimeoutError,
+    as_completed,
+    wait,
+)
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from importlib.util import find_spec
+from os import makedirs, path
+from urllib.parse import urlparse
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+
+from cache_manager import CacheManager
+from json_stream import iter_array
+
+try:
+    import fcntl
+except ImportError:
+    # no cross-process locking on Windows
+    fcntl = None
+
+# seconds to wait for a connection/response before giving up
+TIMEOUT = 30
+
+# number of hosts to keep a pool for, and connections kept per host
+POOL_HOSTS = 10
+POOL_SIZE = 10
+
+HEADERS = {
+    "Accept": "*/*",
+    "Accept-Encoding": "gzip, deflate, sdch",
+    "Accept-Language": "en-US,en;q=0.8",
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "Pragma": "no-cache",
+    "User-Agent": (
+        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_10_5) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/48.0.2564.97 Safari/537.36"
+    ),
+}
+
+# retry throttled/failed requests with jittered exponential backoff
+RETRIES = 4
+BACKOFF = 0.5
+BACKOFF_MAX = 30
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# longest Retry-After we wait for; asked to wait longer, we give up instead
+RETRY_AFTER_MAX = 30
+
+# requests per second (and burst size) allowed per host
+RATE = 4.0
+BURST = 4
+RATE_LIMITS = {
+    # "www.fantasypros.com": (2.0, 2),
+}
+
+# compress cached files with "gzip", "lzma" or None (plain text)
+COMPRESSION = "gzip"
+SUFFIXES = {"gzip": ".gz", "lzma": ".xz"}
+OPENERS = {".gz": gzip.open, ".xz": lzma.open}
+
+# send every request to a stand-in server instead, e.g. "http://localhost:8000"
+# (https://host/path is requested as BASE_URL/host/path)
+BASE_URL = os.environ.get("DFS_BASE_URL")
+
+# evict least recently used entries once the cache (including the archive)
+# holds more than this many bytes; None tracks nothing and never evicts
+CACHE_DIR = "sources"
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+CACHE_INDEX = path.join(CACHE_DIR, ".cache_index")
+
+# BeautifulSoup tree builders for cached html, fastest first. lxml gives
+# the same results as html5lib (see parser_parity.py); html.parser does
+# not on pages that leave out end tags (e.g. </td>), so without lxml the
+# slower html5lib is used.
+SOUP_PARSERS = ["lxml", "html.parser", "html5lib"]
+SOUP_PARSER = "lxml" if find_spec("lxml") else "html5lib"
+
+# the markup split_tables() steps over: comments, elements whose content
+# is not html (a "<table" in them is text), and tags with their attributes
+# (group 1 is "/" for an end tag, group 2 the tag name)
+HTML_TOKEN = re.compile(
+    r"<!--.*?(?:-->|\Z)"
+    r"|<(?:script|style|textarea|title|xmp)\b(?:\"[^\"]*\"|'[^']*'|[^'\">])*>"
+    r".*?(?:</(?:script|style|textarea|title|xmp)\s*>|\Z)"
+    r"|<(/?)([a-zA-Z][^\s/>]*)(?:\"[^\"]*\"|'[^']*'|[^'\">])*>",
+    re.DOTALL | re.IGNORECASE,
+)
+
+# measure the peak memory each source takes to parse (slows parsing down)
+TRACE_MEMORY = False
+
+# how parse_sources starts its worker processes; not "fork", since
+# prefetch and background refresh threads may still be running (holding
+# locks a forked child would inherit)
+PARSE_START_METHOD = (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+# seconds between attempts to take another process's cache fill lock
+LOCK_POLL = 0.05
+
+# freshness policies (seconds)
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+# serve stale cached copies right away and refresh them in the background
+STALE_WHILE_REVALIDATE = False
+REFRESH_WORKERS = 4
+
+_session = None
+_session_lock = threading.Lock()
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+_refresher = None
+_refreshing = {}
+_refresh_lock = threading.Lock()
+
+_deadline = None
+
+_cache_manager = None
+_cache_manager_lock = threading.Lock()
+
+# parsed sources, reused until their cache file changes
+_memo = {}
+_memo_lock = threading.Lock()
+
+# peak bytes allocated while parsing each cache file, with TRACE_MEMORY on
+_parse_peaks = {}
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request cannot finish before the build deadline."""
+
+
+class ChecksumMismatch(Exception):
+    """Raised when a cached body does not match its manifest's sha256."""
+
+
+class TokenBucket:
+    """Allow rate requests per second on average, in bursts of up to burst."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return "TokenBucket(rate={}, burst={})".format(self.rate, self.burst)
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def hold(self, seconds):
+        """Drain the bucket so the host gets no requests for seconds."""
+        with self.lock:
+            self.tokens = min(self.tokens, 1 - seconds * self.rate)
+            self.updated = time.monotonic()
+
+
+class Source:
+    """Declare where a source lives, how it is cached and parsed, and its TTL.
+
+    url and filename are format templates filled from params (season,
+    position, ...). params lists the parameter sets a build needs, and
+    parser(payload, params) turns the loaded JSON/soup into python data.
+    kind is "html" (payload is a soup), "json", "text" (the raw body) or
+    "items" (an iterator over the "data" array of a json object, decoded
+    one element at a time; the parser must consume all of it). Bump
+    version whenever the parser's output changes, so results saved by an
+    older parser are not reused. parse_only is a SoupStrainer for the
+    parts of an html page the parser reads (the rest is never parsed), or
+    for "items" the list of fields to keep of each element.
+
+    kind "tables" is an html page read one <table> at a time: tables has
+    an extract(table) function per table of the page, in the order
+    find_all("table") gives them (nested tables included), and the
+    payload is the list of their results. A table whose html has not
+    changed since the last parse is not extracted again.
+    """
+
+    def __init__(
+        self,
+        url,
+        filename,
+        parser,
+        ttl=None,
+        kind="html",
+        params=None,
+        version=1,
+        parse_only=None,
+        tables=None,
+    ):
+        self.url = url
+        self.filename = filename
+        self.parser = parser
+        self.ttl = ttl
+        self.kind = kind
+        self.params = params or [{}]
+        self.version = version
+        self.parse_only = parse_only
+        self.tables = tables or []
+
+    def __repr__(self):
+        return "Source({}, ttl={})".format(self.url, self.ttl)
+
+    def endpoint(self, **params):
+        return self.url.format(**params)
+
+    def cache_file(self, directory="sources", **params):
+        return path.join(directory, self.filename.format(**params))
+
+    def expand(self, directory="sources"):
+        """List (filename, endpoint, ttl) for every parameter set."""
+        return [
+            (self.cache_file(directory, **params), self.endpoint(**params), self.ttl)
+            for params in self.params
+        ]
+
+
+def set_deadline(seconds):
+    """Give every request from now on seconds in total to finish (None = no limit)."""
+    global _deadline
+    _deadline = None if seconds is None else time.monotonic() + seconds
+
+
+def time_left():
+    """Return the seconds left before the deadline, or None if there is none."""
+    if _deadline is None:
+        return None
+    return _deadline - time.monotonic()
+
+
+def past_deadline():
+    left = time_left()
+    return left is not None and left <= 0
+
+
+def get_session():
+    """Return the process-wide requests session, creating it on first use.
+
+    The session keeps a keep-alive connection pool per host, so repeated
+    requests to lineups.com, fantasypros.com, etc. reuse their connections.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update(HEADERS)
+            _session = session
+    return _session
+
+
+def set_session(session):
+    """Replace the process-wide session (None = create a new one on next use).
+
+    Returns the session that was in use, so callers can put it back.
+    """
+    global _session
+    with _session_lock:
+        previous, _session = _session, session
+    return previous
+
+
+def get_bucket(endpoint):
+    """Return the token bucket for the host of endpoint."""
+    host = urlparse(endpoint).netloc
+    with _buckets_lock:
+        if host not in _buckets:
+            rate, burst = RATE_LIMITS.get(host, (RATE, BURST))
+            _buckets[host] = TokenBucket(rate, burst)
+        return _buckets[host]
+
+
+def retry_after(response):
+    """Return the seconds asked for by a Retry-After header, or None."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff(attempt):
+    """Return a jittered exponential delay for a retry attempt."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF * 2**attempt))
+
+
+def rebase(endpoint):
+    """Return endpoint rewritten to go through BASE_URL, if one is set."""
+    if not BASE_URL:
+        return endpoint
+    url = urlparse(endpoint)
+    target = "{}/{}{}".format(BASE_URL.rstrip("/"), url.netloc, url.path)
+    return target + "?" + url.query if url.query else target
+
+
+def get(endpoint, headers=None, timeout=None):
+    """Send a GET request through the shared session with a default timeout.
+
+    Each request waits for its host's token bucket. Connection errors,
+    timeouts and 429/5xx responses are retried up to RETRIES times with
+    jittered exponential backoff, honoring Retry-After when it is sent.
+    A Retry-After longer than RETRY_AFTER_MAX is not waited for; the
+    response is returned as is.
+    No request or retry wait runs past the deadline (see set_deadline);
+    DeadlineExceeded is raised instead.
+    """
+    if timeout is None:
+        timeout = TIMEOUT
+    # rate limit by the real host even when going through BASE_URL
+    bucket = get_bucket(endpoint)
+    url = rebase(endpoint)
+
+    for attempt in range(RETRIES + 1):
+        bucket.acquire()
+        left = time_left()
+        if left is not None and left <= 0:
+            raise DeadlineExceeded("No time left to request [{}]".format(endpoint))
+        try:
+            response = get_session().get(
+                url,
+                headers=headers,
+                timeout=timeout if left is None else min(timeout, left),
+            )
+        except (requests.ConnectionError, requests.Timeout) as ex:
+            if attempt == RETRIES:
+                raise
+            reason = ex.__class__.__name__
+            delay = backoff(attempt)
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt == RETRIES:
+                return response
+            reason = response.status_code
+            delay = retry_after(response)
+            if delay is None:
+                delay = backoff(attempt)
+            elif delay > RETRY_AFTER_MAX:
+                print(
+                    "Giving up on [{}]: asked to retry after {:.0f}s ({})".format(
+                        endpoint, delay, reason
+                    )
+                )
+                return response
+            else:
+                # the host asked us to back off, so hold everyone else too
+                bucket.hold(delay)
+
+        left = time_left()
+        if left is not None and delay >= left:
+            raise DeadlineExceeded(
+                "No time left to retry [{}] ({})".format(endpoint, reason)
+            )
+
+        print(
+            "Retrying [{}] in {:.1f}s ({}, attempt {} of {})".format(
+                endpoint, delay, reason, attempt + 1, RETRIES
+            )
+        )
+        time.sleep(delay)
+
+
+def get_cache_manager():
+    """Return the cache manager, or None if CACHE_MAX_BYTES is None.
+
+    The first time a cache directory is managed, the entries already in it
+    are indexed by mtime.
+    """
+    global _cache_manager
+    if CACHE_MAX_BYTES is None:
+        return None
+    with _cache_manager_lock:
+        if _cache_manager is None:
+            make_dirs([CACHE_INDEX])
+            seed = not path.isfile(CACHE_INDEX)
+            _cache_manager = CacheManager(
+                CACHE_INDEX,
+                CACHE_MAX_BYTES,
+                remove=remove_cache_entry,
+                lock=lambda: cache_lock(CACHE_INDEX, give_up=False),
+            )
+            if seed:
+                _cache_manager.seed(scan_cache(CACHE_DIR))
+    return _cache_manager
+
+
+def scan_cache(directory):
+    """Return (key, size, mtime) for every entry in directory.
+
+    A cached file and its manifest count as one entry keyed by the
+    uncompressed filename. Subdirectories (parsed results, the archive)
+    are not entries: the archive must keep every object a run index
+    names, whenever it was last read.
+    """
+    entries = {}
+    for name in os.listdir(directory):
+        filename = path.join(directory, name)
+        if filename == CACHE_INDEX or name.endswith((".tmp", ".lock")):
+            continue
+        if not path.isfile(filename):
+            continue
+        if name.endswith(".meta.json"):
+            key = filename[: -len(".meta.json")]
+        else:
+            key = filename
+            for suffix in SUFFIXES.values():
+                if name.endswith(suffix):
+                    key = filename[: -len(suffix)]
+        stat = os.stat(filename)
+        size, mtime = entries.get(key, (0, 0))
+        entries[key] = (size + stat.st_size, max(mtime, stat.st_mtime))
+    return [(key, size, mtime) for key, (size, mtime) in entries.items()]
+
+
+def remove_cache_entry(key):
+    """Delete a cache entry and everything kept alongside it."""
+    # not key.lock: a lock file is only removed by the process holding it
+    related = [manifest_path(key), artifact_path(key), tables_path(key)]
+    for filename in [key] + [key + s for s in SUFFIXES.values()] + related:
+        if path.isfile(filename):
+            os.remove(filename)
+
+
+def track_cache(key, size=None):
+    """Tell the cache manager key was read (or written, with its size)."""
+    manager = get_cache_manager()
+    if manager is not None:
+        manager.touch(key, size)
+
+
+def keep_sources(sources):
+    """Don't evict any of (filename, endpoint, ttl) until release_sources."""
+    manager = get_cache_manager()
+    if manager is not None:
+        manager.keep(fn for fn, _, _ in sources)
+
+
+def release_sources(sources):
+    """Let (filename, endpoint, ttl) kept by keep_sources be evicted again."""
+    manager = get_cache_manager()
+    if manager is not None:
+        manager.release(fn for fn, _, _ in sources)
+
+
+def cache_path(filename):
+    """Return the file actually holding a cached entry (compressed or not).
+
+    Returns None if the entry is not cached.
+    """
+    for suffix in SUFFIXES.values():
+        if path.isfile(filename + suffix):
+            return filename + suffix
+    if path.isfile(filename):
+        return filename
+    return None
+
+
+def is_cached(filename):
+    return cache_path(filename) is not None
+
+
+def open_cache(filename):
+    """Open a cached entry for reading as text, decompressing if needed.
+
+    Newlines are read back untranslated, so the body hashes the same as
+    the response it was written from.
+    """
+    physical = cache_path(filename)
+    if physical is None:
+        raise FileNotFoundError(filename)
+    track_cache(filename)
+    opener = OPENERS.get(path.splitext(physical)[1])
+    if opener:
+        return opener(physical, "rt", encoding="utf-8", newline="")
+    return open(physical, "r", newline="")
+
+
+def read_cache(filename):
+    """Return the body stored in a cache entry."""
+    with open_cache(filename) as infile:
+        text = infile.read()
+    # print() added a trailing newline when the entry was written
+    return text[:-1] if text.endswith("\n") else text
+
+
+def temp_name(filename):
+    """Return a temp file name next to filename, unique to this thread."""
+    return "{}.{}.{}.tmp".format(filename, os.getpid(), threading.get_ident())
+
+
+def checksum(text):
+    """Return the sha256 of a cached body, as stored in its manifest."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def open_lock(filename, give_up=True):
+    """Open filename.lock and flock it, returning the open file.
+
+    The holder removes the lock file before it lets go, so a lock taken
+    on a file that has since been removed (or replaced) is dropped and
+    taken again on the current one.
+    """
+    lock_name = filename + ".lock"
+    while True:
+        lock_file = open(lock_name, "a")
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if give_up and past_deadline():
+                    lock_file.close()
+                    raise DeadlineExceeded(
+                        "Timed out waiting for [{}]".format(filename)
+                    )
+                time.sleep(LOCK_POLL)
+        try:
+            if path.samestat(os.stat(lock_name), os.fstat(lock_file.fileno())):
+                return lock_file
+        except FileNotFoundError:
+            pass
+        lock_file.close()
+
+
+@contextmanager
+def cache_lock(filename, give_up=True):
+    """Hold an exclusive lock on filename across processes and threads.
+
+    Waiting gives up with DeadlineExceeded once the build deadline passes,
+    unless give_up is False. The lock file is removed on release.
+    """
+    if fcntl is None:
+        yield
+        return
+
+    lock_file = open_lock(filename, give_up)
+    try:
+        yield
+    finally:
+        os.remove(filename + ".lock")
+        lock_file.close()
+
+
+def write_cache(filename, text):
+    """Write a cache entry using COMPRESSION, replacing any other variant."""
+    suffix = SUFFIXES.get(COMPRESSION, "")
+    # write to a temp file and swap it in, so readers never see half a file
+    # while a background refresh (or another process) rewrites it
+    tmp_file = temp_name(filename + suffix)
+    if suffix:
+        with OPENERS[suffix](tmp_file, "wt", encoding="utf-8", newline="") as outfile:
+            print(text, file=outfile)
+    else:
+        with open(tmp_file, "w", newline="") as outfile:
+            print(text, file=outfile)
+    os.replace(tmp_file, filename + suffix)
+    track_cache(filename, path.getsize(filename + suffix))
+
+    # remove stale copies stored with a different compression
+    for other in [filename] + [filename + s for s in SUFFIXES.values()]:
+        if other != filename + suffix and path.isfile(other):
+            os.remove(other)
+
+
+def migrate_cache(directory="sources"):
+    """Rewrite every plain cached file in directory using COMPRESSION."""
+    skip = tuple(SUFFIXES.values()) + (".meta.json", ".lock", ".tmp")
+    migrated = 0
+    for filename in glob.glob(path.join(directory, "*")):
+        if not path.isfile(filename) or filename.endswith(skip):
+            continue
+        write_cache(filename, read_cache(filename))
+        migrated += 1
+    print("Migrate: compressed {} files in [{}]".format(migrated, directory))
+    return migrated
+
+
+def manifest_path(filename):
+    """Return the path of the manifest stored next to a cached file."""
+    return filename + ".meta.json"
+
+
+def read_manifest(filename):
+    """Return the manifest for a cached file, or an empty dict if there is none."""
+    meta_file = manifest_path(filename)
+    if not path.isfile(meta_file):
+        return {}
+    with open(meta_file, "r") as json_file:
+        return json.load(json_file)
+
+
+def write_manifest(filename, manifest):
+    """Store the manifest for a cached file."""
+    tmp_file = temp_name(manifest_path(filename))
+    with open(tmp_file, "w") as outfile:
+        json.dump(manifest, outfile)
+    os.replace(tmp_file, manifest_path(filename))
+
+
+def revalidate(filename, endpoint, headers=None):
+    """Make sure filename holds the current body of endpoint.
+
+    If the file is already cached, a conditional request is sent using the
+    ETag/Last-Modified from its manifest and the local copy is kept on a
+    304. Returns True if the file was (re)written, False if not modified.
+    """
+    manifest = read_manifest(filename) if is_cached(filename) else {}
+
+    # build conditional headers from the manifest
+    conditional = dict(headers or {})
+    if manifest.get("etag"):
+        conditional["If-None-Match"] = manifest["etag"]
+    if manifest.get("last_modified"):
+        conditional["If-Modified-Since"] = manifest["last_modified"]
+
+    # send GET request
+    response = get(endpoint, headers=conditional)
+    status = response.status_code
+
+    if status == 304 and manifest:
+        # local copy is still good, just note when we checked
+        manifest["fetched_at"] = time.time()
+        write_manifest(filename, manifest)
+        return False
+
+    # if not successful, raise an exception
+    if status != 200:
+        raise requests.HTTPError(
+            "Requests status != 200. It is: {0}".format(status), response=response
+        )
+
+    # dump body to file to avoid multiple requests
+    write_cache(filename, response.text)
+
+    write_manifest(
+        filename,
+        {
+            "url": endpoint,
+            "fetched_at": time.time(),
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "sha256": checksum(response.text),
+        },
+    )
+    return True
+
+
+def fill(filename, endpoint, headers=None):
+    """revalidate() filename while holding its lock (single-flight).
+
+    Only one process or thread fetches a file at a time. If another one
+    refreshed it while we waited for the lock, its copy is used instead
+    of fetching again. Returns True if the file was (re)written.
+    """
+    seen = read_manifest(filename).get("fetched_at")
+    with cache_lock(filename):
+        if is_cached(filename) and read_manifest(filename).get("fetched_at") != seen:
+            print("Using [{}] just fetched by another process".format(filename))
+            return False
+        return revalidate(filename, endpoint, headers=headers)
+
+
+def is_stale(filename, ttl):
+    """Return True if a cached file is older than ttl seconds (None = never)."""
+    if ttl is None:
+        return False
+    return source_age(filename) > ttl
+
+
+def source_age(filename):
+    """Return how many seconds ago a cached file was fetched (None if missing)."""
+    if not is_cached(filename):
+        return None
+    # fall back to the file's mtime for files cached before manifests existed
+    fetched_at = read_manifest(filename).get("fetched_at") or path.getmtime(
+        cache_path(filename)
+    )
+    return time.time() - fetched_at
+
+
+def refresh_in_background(filename, endpoint):
+    """Revalidate filename on a background thread.
+
+    A file already being refreshed is not queued again. Returns the future.
+    """
+    global _refresher
+    with _refresh_lock:
+        if _refresher is None:
+            _refresher = ThreadPoolExecutor(
+                max_workers=REFRESH_WORKERS, thread_name_prefix="refresh"
+            )
+        future = _refreshing.get(filename)
+        if future is None or future.done():
+            future = _refresher.submit(fill, filename, endpoint)
+            future.add_done_callback(lambda f: report_refresh(f, endpoint))
+            _refreshing[filename] = future
+    return future
+
+
+def report_refresh(future, endpoint):
+    if future.exception() is not None:
+        print("Refresh: failed [{}]: {}".format(endpoint, future.exception()))
+    elif future.result():
+        print("Refresh: updated [{}]".format(endpoint))
+
+
+def wait_for_refreshes(timeout=None):
+    """Wait for background refreshes; return how many are still running."""
+    with _refresh_lock:
+        futures = list(_refreshing.values())
+    return len(wait(futures, timeout).not_done)
+
+
+def download(filename, endpoint, headers=None):
+    """Pull endpoint and dump the response body to filename.
+
+    Returns the number of seconds the request took.
+    """
+    start = time.perf_counter()
+    fill(filename, endpoint, headers=headers)
+    return time.perf_counter() - start
+
+
+def ensure_cached(filename, endpoint, refresh=False, ttl=None):
+    """Pull endpoint into filename if it is missing, revalidate it if stale."""
+    if not is_cached(filename):
+        print(
+            "{} does not exist. Pulling from endpoint [{}]".format(filename, endpoint)
+        )
+        fill(filename, endpoint)
+    elif refresh or is_stale(filename, ttl):
+        if STALE_WHILE_REVALIDATE and not refresh:
+            print("Serving stale [{}], refreshing in the background".format(filename))
+            refresh_in_background(filename, endpoint)
+        elif past_deadline():
+            print("Deadline passed, using cached [{}]".format(filename))
+        else:
+            print("Revalidating [{}] against [{}]".format(filename, endpoint))
+            try:
+                fill(filename, endpoint)
+            except DeadlineExceeded as ex:
+                print("{}, using cached [{}]".format(ex, filename))
+    else:
+        print("File exists [{}]. Nice!".format(filename))
+
+
+def read_verified(filename):
+    """Return the body of a cached file, checked against its manifest's sha256.
+
+    A mismatch usually means another process is halfway through updating
+    the file and its manifest, so it is read again once that fill is done.
+    """
+    text = read_cache(filename)
+    expected = read_manifest(filename).get("sha256")
+    if expected is None or checksum(text) == expected:
+        return text
+
+    with cache_lock(filename):
+        text = read_cache(filename)
+        expected = read_manifest(filename).get("sha256")
+    if expected is not None and checksum(text) != expected:
+        raise ChecksumMismatch(
+            "Checksum mismatch for cached file [{}]".format(filename)
+        )
+    return text
+
+
+def read_json(filename):
+    """Load json from a cached file."""
+    return json.loads(read_verified(filename))
+
+
+def iter_json(filename, key="data", fields=None):
+    """Yield the elements of the key array of a cached json object one by one.
+
+    With fields, each element is cut down to those keys, so a large
+    response never has to be held in memory all at once. The body is
+    checked against its manifest's sha256 once all of it has been read,
+    raising ChecksumMismatch if it doesn't match.
+    """
+    expected = read_manifest(filename).get("sha256")
+    digest = hashlib.sha256()
+    held = ""
+
+    def update(chunk):
+        # hold back a trailing newline: print() added one to the body
+        nonlocal held
+        chunk = held + chunk
+        held = "\n" if chunk.endswith("\n") else ""
+        digest.update(chunk[: len(chunk) - len(held)].encode("utf-8"))
+
+    with open_cache(filename) as infile:
+        yield from iter_array(infile, key, fields, on_read=update)
+
+    if expected is not None and digest.hexdigest() != expected:
+        raise ChecksumMismatch(
+            "Checksum mismatch for cached file [{}]".format(filename)
+        )
+
+
+def read_soup(filename, parser=None, parse_only=None):
+    """Load html from a cached file with parser (default SOUP_PARSER).
+
+    With parse_only (a SoupStrainer), only the matching elements are
+    built. html5lib does not support that and always parses everything.
+    """
+    parser = parser or SOUP_PARSER
+    if parser == "html5lib":
+        parse_only = None
+    return BeautifulSoup(read_verified(filename), parser, parse_only=parse_only)
+
+
+def pull_data(filename, endpoint, refresh=False, ttl=None):
+    """Either pull file from API or from file."""
+    ensure_cached(filename, endpoint, refresh, ttl)
+    return read_json(filename)
+
+
+def pull_soup_data(filename, endpoint, refresh=False, ttl=None):
+    """Either pull file from html or from file."""
+    ensure_cached(filename, endpoint, refresh, ttl)
+    return read_soup(filename)
+
+
+def file_version(filename):
+    """Return something that changes whenever a cache entry is rewritten."""
+    physical = cache_path(filename)
+    stat = os.stat(physical)
+    return physical, stat.st_mtime_ns, stat.st_size
+
+
+def artifact_path(filename):
+    """Return where the parsed result of a cache entry is saved."""
+    return path.join(
+        path.dirname(filename), "parsed", path.basename(filename) + ".pickle"
+    )
+
+
+def read_artifact(filename, sha256, version):
+    """Return the saved parsed result for filename, or None if it is out of date."""
+    try:
+        with open(artifact_path(filename), "rb") as infile:
+            artifact = pickle.load(infile)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    if artifact["sha256"] != sha256 or artifact["version"] != version:
+        return None
+    return artifact
+
+
+def dump_pickle(target, data):
+    make_dirs([target])
+    tmp_file = temp_name(target)
+    with open(tmp_file, "wb") as outfile:
+        pickle.dump(data, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, target)
+
+
+def write_artifact(filename, sha256, version, result):
+    """Save the parsed result for filename next to the cache."""
+    dump_pickle(
+        artifact_path(filename),
+        {"sha256": sha256, "version": version, "result": result},
+    )
+
+
+def tables_path(filename):
+    """Return where the per-table results of a "tables" source are saved."""
+    return path.join(
+        path.dirname(filename), "parsed", path.basename(filename) + ".tables.pickle"
+    )
+
+
+def read_table_results(filename, version):
+    """Return {index: (sha256 of the table's html, result)}, or {} if out of date."""
+    try:
+        with open(tables_path(filename), "rb") as infile:
+            saved = pickle.load(infile)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return {}
+    if saved["version"] != version:
+        return {}
+    return saved["tables"]
+
+
+def write_table_results(filename, version, tables):
+    dump_pickle(tables_path(filename), {"version": version, "tables": tables})
+
+
+def parser_version(source):
+    """Return the version parsed results of source are saved under."""
+    if source.kind in ("html", "tables"):
+        return source.version, SOUP_PARSER
+    return source.version
+
+
+def body_checksum(filename):
+    # the manifest already has the body's hash, unless it predates checksums
+    sha256 = read_manifest(filename).get("sha256")
+    if sha256 is None:
+        sha256 = checksum(read_cache(filename))
+    return sha256
+
+
+def find_parsed(source, filename, params):
+    """Return (True, result) if source was parsed since filename last changed.
+
+    Looks in the in-process memo, then in the saved artifacts.
+    Returns (False, None) if it has to be parsed.
+    """
+    key = (source, filename, tuple(sorted(params.items())))
+    version = file_version(filename)
+    with _memo_lock:
+        hit = _memo.get(key)
+    if hit is not None and hit[0] == version:
+        return True, hit[1]
+
+    artifact = read_artifact(filename, body_checksum(filename), parser_version(source))
+    if artifact is None:
+        return False, None
+    with _memo_lock:
+        _memo[key] = (version, artifact["result"])
+    return True, artifact["result"]
+
+
+def save_parsed(source, filename, params, version, sha256, result):
+    """Memoize and save a result parsed from the file at version/sha256."""
+    key = (source, filename, tuple(sorted(params.items())))
+    write_artifact(filename, sha256, parser_version(source), result)
+    with _memo_lock:
+        _memo[key] = (version, result)
+
+
+def parse_payload(source, filename, params, soup_parser=None):
+    """Read a cached source and run its parser, without any caching.
+
+    An html tree is decomposed as soon as the parser is done with it, so
+    its memory is freed right away rather than whenever the garbage
+    collector gets to its reference cycles. Parsers must only return plain
+    python values (not elements of the tree).
+    """
+    if source.kind == "items":
+        return parse_items(source, filename, params)
+    if source.kind == "tables":
+        return parse_tables(source, filename, params, soup_parser)
+    if source.kind == "json":
+        payload = read_json(filename)
+    elif source.kind == "text":
+        payload = read_verified(filename)
+    else:
+        payload = read_soup(filename, soup_parser, source.parse_only)
+    result = source.parser(payload, params)
+    if source.kind == "html":
+        payload.decompose()
+    return result
+
+
+def parse_items(source, filename, params):
+    """Run the parser of an "items" source over its streamed elements."""
+    try:
+        return source.parser(iter_json(filename, fields=source.parse_only), params)
+    except ChecksumMismatch:
+        # another process is halfway through updating it; wait for that
+        with cache_lock(filename):
+            return source.parser(iter_json(filename, fields=source.parse_only), params)
+
+
+def split_tables(text):
+    """Return the html of every <table> of a page, in document order.
+
+    The tables are the ones (and in the order) find_all("table") gives,
+    so a nested table is listed after the one holding it, and also makes
+    up part of its html. A "<table" in a comment, a script or an
+    attribute value is not a table.
+    """
+    starts = []
+    ends = {}
+    open_tables = []
+    for match in HTML_TOKEN.finditer(text):
+        if (match.group(2) or "").lower() != "table":
+            continue
+        if not match.group(1):
+            open_tables.append(len(starts))
+            starts.append(match.start())
+        elif open_tables:
+            ends[open_tables.pop()] = match.end()
+    # an unclosed table runs to the end of the page
+    return [text[start : ends.get(i, len(text))] for i, start in enumerate(starts)]
+
+
+def extract_table(extract, fragment, soup_parser=None):
+    """Parse the html of one table and run extract on it."""
+    soup = BeautifulSoup(fragment, soup_parser or SOUP_PARSER)
+    result = extract(soup.find("table"))
+    soup.decompose()
+    return result
+
+
+def parse_tables(source, filename, params, soup_parser=None):
+    """Run the parser of a "tables" source, extracting only changed tables.
+
+    The html of each table is hashed, and tables with the same hash (and
+    source version) as at the last parse reuse their saved result. The
+    results are saved before the parser runs, so it must not modify them.
+    """
+    soup_parser = soup_parser or SOUP_PARSER
+    version = (source.version, soup_parser)
+    saved = read_table_results(filename, version)
+
+    results = []
+    tables = {}
+    unchanged = 0
+    fragments = split_tables(read_verified(filename))
+    for index, (extract, fragment) in enumerate(zip(source.tables, fragments)):
+        sha256 = checksum(fragment)
+        hit = saved.get(index)
+        if hit is not None and hit[0] == sha256:
+            result = hit[1]
+            unchanged += 1
+        else:
+            result = extract_table(extract, fragment, soup_parser)
+        tables[index] = (sha256, result)
+        results.append(result)
+
+    if unchanged < len(results):
+        write_table_results(filename, version, tables)
+    if unchanged:
+        print(
+            "Parse: {} of {} tables unchanged [{}]".format(
+                unchanged, len(results), filename
+            )
+        )
+    return source.parser(results, params)
+
+
+def run_parser(source, filename, params, soup_parser=None, trace=False):
+    """Run parse_payload, returning (result, peak bytes it allocated).
+
+    The peak is None unless trace is on. tracemalloc counts every thread,
+    so peaks are only exact when sources are parsed one at a time (like in
+    parse_sources' workers). Tracing is stopped again if it was off.
+    """
+    if not trace:
+        return parse_payload(source, filename, params, soup_parser), None
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        result = parse_payload(source, filename, params, soup_parser)
+        return result, tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        if started:
+            tracemalloc.stop()
+
+
+def record_peak(filename, peak):
+    if peak is None:
+        return
+    _parse_peaks[filename] = peak
+    print("Parse: peak {:.1f} MB [{}]".format(peak / 1024 / 1024, filename))
+
+
+def parse_peaks():
+    """Return {filename: peak bytes} for the sources parsed with TRACE_MEMORY."""
+    return dict(_parse_peaks)
+
+
+def clear_parse_peaks():
+    _parse_peaks.clear()
+
+
+def parse_source(source, filename, params):
+    """Read and parse a cached source.
+
+    Results are saved under parsed/ keyed by the sha256 of the cached body
+    and source.version, so a warm build loads them without parsing any
+    html. They are also kept in memory keyed by (source, params) for as
+    long as the cache file is unchanged, so building several workbooks in
+    one process loads each one once. Callers must not modify them.
+    """
+    found, result = find_parsed(source, filename, params)
+    if found:
+        return result
+
+    # note the file's version before reading it, in case it changes meanwhile
+    version = file_version(filename)
+    sha256 = body_checksum(filename)
+    result, peak = run_parser(source, filename, params, trace=TRACE_MEMORY)
+    record_peak(filename, peak)
+    save_parsed(source, filename, params, version, sha256, result)
+    return result
+
+
+def init_parse_worker():
+    # workers only read the cache; leave the index to the parent
+    global CACHE_MAX_BYTES
+    CACHE_MAX_BYTES = None
+
+
+def is_main_guard(node):
+    """Return True if node is an `if __name__ == "__main__":` block."""
+    if not isinstance(node, ast.If) or not isinstance(node.test, ast.Compare):
+        return False
+    test = node.test
+    if len(test.ops) != 1 or not isinstance(test.ops[0], ast.Eq):
+        return False
+    operands = [test.left] + test.comparators
+    names = [x.id for x in operands if isinstance(x, ast.Name)]
+    values = [x.value for x in operands if isinstance(x, ast.Constant)]
+    return names == ["__name__"] and values == ["__main__"]
+
+
+def main_is_guarded():
+    """Return False if a new worker process would run the calling script again.
+
+    spawn and forkserver workers import __main__ again, so a script that
+    calls us from its top level (rather than under an
+    `if __name__ == "__main__":` block) would re-run in every worker.
+    """
+    main = sys.modules.get("__main__")
+    filename = getattr(main, "__file__", None)
+    if filename is None:
+        # interactive session or python -c: there is nothing to re-run
+        return True
+
+    # find the statement of the script's top level that is running us
+    frame = sys._getframe()
+    while frame is not None:
+        if frame.f_globals is vars(main) and frame.f_code.co_name == "<module>":
+            break
+        frame = frame.f_back
+    if frame is None:
+        return True
+
+    try:
+        with open(filename, "r") as infile:
+            tree = ast.parse(infile.read())
+    except (OSError, SyntaxError, ValueError):
+        return False
+    for node in tree.body:
+        if node.lineno <= frame.f_lineno <= node.end_lineno:
+            return is_main_guard(node)
+    return False
+
+
+def parse_sources(sources, directory="sources", max_workers=None):
+    """Parse every cached html page of sources (Source objects) in parallel.
+
+    Each page is parsed in a worker process, which sends back only the
+    plain python result. Results are memoized and saved as parse_source
+    would, so later load_source calls don't parse again. Pages already
+    parsed, not cached, or not html (or "tables") are skipped. Returns how
+    many were parsed.
+
+    Workers import __main__ again (see PARSE_START_METHOD), so a script
+    calling this must do so under `if __name__ == "__main__":`. Without
+    that guard the pages are parsed one by one in this process instead.
+    """
+    todo = []
+    for source in sources:
+        if source.kind not in ("html", "tables"):
+            continue
+        for params in source.params:
+            filename = source.cache_file(directory, **params)
+            if is_cached(filename) and not find_parsed(source, filename, params)[0]:
+                todo.append((source, filename, params))
+    if not todo:
+        return 0
+
+    parsed = 0
+    start = time.perf_counter()
+    if main_is_guarded():
+        with ProcessPoolExecutor(
+            max_workers,
+            mp_context=multiprocessing.get_context(PARSE_START_METHOD),
+            initializer=init_parse_worker,
+        ) as executor:
+            futures = {}
+            for source, filename, params in todo:
+                version = file_version(filename)
+                sha256 = body_checksum(filename)
+                future = executor.submit(
+                    run_parser, source, filename, params, SOUP_PARSER, TRACE_MEMORY
+                )
+                futures[future] = (source, filename, params, version, sha256)
+
+            for future in as_completed(futures):
+                source, filename, params, version, sha256 = futures[future]
+                try:
+                    result, peak = future.result()
+                    record_peak(filename, peak)
+                    save_parsed(source, filename, params, version, sha256, result)
+                    parsed += 1
+                except Exception as ex:
+                    print("Parse: failed [{}]: {}".format(filename, ex))
+    else:
+        print('Parse: no `if __name__ == "__main__":` guard, parsing in process')
+        for source, filename, params in todo:
+            try:
+                parse_source(source, filename, params)
+                parsed += 1
+            except Exception as ex:
+                print("Parse: failed [{}]: {}".format(filename, ex))
+
+    print(
+        "Parse: {} of {} pages in {:.2f}s".format(
+            parsed, len(todo), time.perf_counter() - start
+        )
+    )
+    return parsed
+
+
+def clear_memo():
+    """Forget every parsed source."""
+    with _memo_lock:
+        _memo.clear()
+
+
+def load_source(source, directory="sources", **params):
+    """Pull a registered source (refreshing it if stale) and parse it."""
+    filename = source.cache_file(directory, **params)
+    ensure_cached(filename, source.endpoint(**params), ttl=source.ttl)
+    return parse_source(source, filename, params)
+
+
+def refresh_cache(directory="sources", max_workers=8):
+    """Revalidate every cached file in directory that has a manifest.
+
+    Each file is filled under its lock, so a refresh overlapping a build
+    never fetches the same file twice.
+    """
+    sources = []
+    for meta_file in glob.glob(path.join(directory, "*.meta.json")):
+        filename = meta_file[: -len(".meta.json")]
+        manifest = read_manifest(filename)
+        if manifest.get("url"):
+            sources.append((filename, manifest["url"]))
+
+    modified = 0
+    with ThreadPoolExecutor(max_workers=min(max_workers, POOL_SIZE)) as executor:
+        futures = {executor.submit(fill, fn, url): url for fn, url in sources}
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                if future.result():
+                    modified += 1
+                    print("Refresh: updated [{}]".format(url))
+            except Exception as ex:
+                print("Refresh: failed [{}]: {}".format(url, ex))
+
+    print("Refresh: {} of {} sources changed".format(modified, len(sources)))
+    return modified
+
+
+def make_dirs(filenames):
+    """Make the sources dir(s) for filenames if they do not exist."""
+    for directory in {path.dirname(fn) for fn in filenames}:
+        if directory and not path.exists(directory):
+            makedirs(directory)
+
+
+def stale_sources(sources):
+    """Return (filename, endpoint) for every source that is missing or stale."""
+    return [
+        (fn, url) for fn, url, ttl in sources if not is_cached(fn) or is_stale(fn, ttl)
+    ]
+
+
+def sources_to_fetch(sources):
+    """Return the (filename, endpoint) a build has to wait for.
+
+    With STALE_WHILE_REVALIDATE only missing files are returned; stale
+    ones are handed to refresh_in_background instead.
+    """
+    if not STALE_WHILE_REVALIDATE:
+        return stale_sources(sources)
+
+    missing = []
+    for fn, url in stale_sources(sources):
+        if is_cached(fn):
+            refresh_in_background(fn, url)
+        else:
+            missing.append((fn, url))
+    return missing
+
+
+def source_ages(sources):
+    """Describe the cached copy of every (filename, endpoint, ttl).
+
+    Returns a list of dicts with filename, url, fetched_at, age and
+    stale, for reporting which inputs a build used.
+    """
+    ages = []
+    for fn, url, ttl in sources:
+        age = source_age(fn)
+        ages.append(
+            {
+                "filename": fn,
+                "url": url,
+                "fetched_at": None if age is None else time.time() - age,
+                "age": age,
+                "stale": age is None or (ttl is not None and age > ttl),
+            }
+        )
+    return ages
+
+
+def prefetch(sources, max_workers=8):
+    """Fill the cache for every (filename, endpoint, ttl) in parallel.
+
+    Files that are cached and still fresh are skipped; stale ones are
+    revalidated. Failures are reported but not raised; the pull_*
+    functions will try those endpoints again later.
+    """
+    # only fetch what is missing or stale
+    missing = sources_to_fetch(sources)
+    if not missing:
+        print("Prefetch: all {} sources are fresh.".format(len(sources)))
+        return {}
+
+    make_dirs(fn for fn, _ in missing)
+
+    timings = {}
+    start = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, POOL_SIZE))
+    futures = {executor.submit(download, fn, url): url for fn, url in missing}
+    try:
+        for future in as_completed(futures, timeout=time_left()):
+            url = futures[future]
+            try:
+                timings[url] = future.result()
+                print("Prefetch: {:6.2f}s [{}]".format(timings[url], url))
+            except Exception as ex:
+                print("Prefetch: failed [{}]: {}".format(url, ex))
+    except TimeoutError:
+        for future, url in futures.items():
+            if not future.done():
+                print("Prefetch: deadline passed for [{}]".format(url))
+    finally:
+        # don't wait on requests still running past the deadline
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    print(
+        "Prefetch: {} of {} sources in {:.2f}s".format(
+            len(timings), len(missing), time.perf_counter() - start
+        )
+    )
+    return timings
+
+
+if __name__ == "__main__":
+    if "--migrate" in sys.argv[1:]:
+        migrate_cache()
+    refresh_cache()
@@ -0,0 +1,141 @@
+"""Decode the elements of a large json array one at a time.
+
+The lineups.com responses are an object whose "data" array has one
+object per player. iter_array() reads such a document from a file in
+chunks and yields the array's elements as json.JSONDecoder.raw_decode
+decodes them, so only one chunk and one element are in memory at a
+time rather than the whole document.
+
+    with open("nfl_snaps.json") as infile:
+        for player in iter_array(infile, "data", ["full_name", "weeks"]):
+            ...
+"""
+
+import json
+import re
+
+CHUNK_SIZE = 64 * 1024
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+# characters a number can go on with
+NUMBER_TAIL = re.compile(r"[0-9.eE+-]*")
+
+
+class Reader:
+    """Decode json values from a text file, reading it a chunk at a time.
+
+    on_read(chunk) is called with every chunk read, e.g. to hash the file.
+    """
+
+    def __init__(self, infile, chunk_size=CHUNK_SIZE, on_read=None):
+        self.infile = infile
+        self.chunk_size = chunk_size
+        self.on_read = on_read
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Read another chunk, dropping what was decoded already.
+
+        Returns False at the end of the file.
+        """
+        if self.eof:
+            return False
+        chunk = self.infile.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        if self.on_read is not None:
+            self.on_read(chunk)
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Skip whitespace and return the next character ("" at the end)."""
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, chars):
+        """Consume the next character, which must be one of chars."""
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(
+                "Expected one of {!r} but found {!r}".format(chars, char or "EOF")
+            )
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decode the next value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # the value goes on in the next chunk
+                if not self.fill():
+                    raise
+                continue
+            # a number that runs to the end of the buffer may go on too
+            if (
+                isinstance(value, (int, float))
+                and NUMBER_TAIL.match(self.buffer, end).end() == len(self.buffer)
+                and self.fill()
+            ):
+                continue
+            self.pos = end
+            return value
+
+    def drain(self):
+        """Read the rest of the file (so on_read sees all of it)."""
+        while self.fill():
+            self.pos = len(self.buffer)
+
+
+def project(item, fields):
+    """Return item with only fields (those it has), or item if fields is None."""
+    if fields is None or not isinstance(item, dict):
+        return item
+    return {field: item[field] for field in fields if field in item}
+
+
+def iter_array(infile, key, fields=None, chunk_size=CHUNK_SIZE, on_read=None):
+    """Yield the elements of the array under key in a json object in infile.
+
+    With fields, object elements are cut down to those keys. Other
+    members of the object are decoded and dropped. Raises KeyError if the
+    object has no key.
+    """
+    reader = Reader(infile, chunk_size, on_read)
+    found = False
+    reader.expect("{")
+    if reader.peek() == "}":
+        reader.pos += 1
+    else:
+        while True:
+            name = reader.value()
+            reader.expect(":")
+            if name != key:
+                reader.value()
+            else:
+                found = True
+                reader.expect("[")
+                if reader.peek() == "]":
+                    reader.pos += 1
+                else:
+                    while True:
+                        yield project(reader.value(), fields)
+                        if reader.expect(",]") == "]":
+                            break
+            if reader.expect(",}") == "}":
+                break
+    reader.drain()
+    if not found:
+        raise KeyError(key)
@@ -0,0 +1,134 @@
+"""Check that every html source parses the same under each soup backend.
+
+Each cached html page in the registry is parsed with every backend in
+fetch.SOUP_PARSERS (limited to the source's parse_only strainer) and run
+through its source's parser; the results must match the ones a full
+html5lib parse (the original behaviour) gives. Sources of kind "tables"
+have each table's html parsed on its own, as fetch.parse_tables does.
+Timings are printed so the fastest backend that matches can be made
+fetch.SOUP_PARSER.
+
+The html pages dfs_sheet.py reads with pull_soup_data (dfs_sheet.SOUP_PAGES)
+are checked too, by comparing the worksheets each backend fills in. Those
+read their pages from ./sources, whatever the sources dir given.
+
+    python parser_parity.py [sources dir]
+"""
+
+import sys
+import time
+
+from bs4 import BeautifulSoup
+from openpyxl import Workbook
+
+import fetch
+
+REFERENCE = "html5lib"
+
+
+def parse_reference(source, text, params):
+    """Parse a whole page with REFERENCE and run the source's parser on it."""
+    soup = BeautifulSoup(text, REFERENCE)
+    if source.kind != "tables":
+        return source.parser(soup, params)
+    tables = soup.find_all("table")
+    return source.parser(
+        [extract(table) for extract, table in zip(source.tables, tables)], params
+    )
+
+
+def check(sources, parsers=None, directory="sources"):
+    """Compare parsers on every cached html source.
+
+    sources is a registry like player_dfs_sheet.SOURCES. Returns
+    ({parser: [files that differ from REFERENCE]}, {parser: seconds}).
+    """
+    parsers = parsers or fetch.SOUP_PARSERS
+    mismatches = {parser: [] for parser in parsers}
+    timings = {parser: 0.0 for parser in parsers}
+
+    for source in sources.values():
+        if source.kind not in ("html", "tables"):
+            continue
+        for params in source.params:
+            filename = source.cache_file(directory, **params)
+            if not fetch.is_cached(filename):
+                print("Parity: [{}] is not cached, skipping".format(filename))
+                continue
+            text = fetch.read_verified(filename)
+            expected = parse_reference(source, text, params)
+
+            for parser in parsers:
+                start = time.perf_counter()
+                if source.kind == "tables":
+                    result = source.parser(
+                        [
+                            fetch.extract_table(extract, fragment, parser)
+                            for extract, fragment in zip(
+                                source.tables, fetch.split_tables(text)
+                            )
+                        ],
+                        params,
+                    )
+                else:
+                    parse_only = None if parser == REFERENCE else source.parse_only
+                    soup = BeautifulSoup(text, parser, parse_only=parse_only)
+                    result = source.parser(soup, params)
+                timings[parser] += time.perf_counter() - start
+                if result != expected:
+                    mismatches[parser].append(filename)
+
+    return mismatches, timings
+
+
+def fill_sheets(func, args, parser):
+    """Run a dfs_sheet function with parser and return its sheets' values."""
+    previous = fetch.SOUP_PARSER
+    fetch.SOUP_PARSER = parser
+    try:
+        workbook = Workbook()
+        func(workbook, *args)
+    finally:
+        fetch.SOUP_PARSER = previous
+    return {ws.title: [list(row) for row in ws.values] for ws in workbook}
+
+
+def check_sheets(pages, parsers=None):
+    """Compare parsers on every cached page of pages (see dfs_sheet.SOUP_PAGES).
+
+    Returns ({parser: [files that differ from REFERENCE]}, {parser: seconds}).
+    """
+    parsers = parsers or fetch.SOUP_PARSERS
+    mismatches = {parser: [] for parser in parsers}
+    timings = {parser: 0.0 for parser in parsers}
+
+    for filename, func, args in pages:
+        if not fetch.is_cached(filename):
+            print("Parity: [{}] is not cached, skipping".format(filename))
+            continue
+        expected = fill_sheets(func, args, REFERENCE)
+        for parser in parsers:
+            start = time.perf_counter()
+            result = fill_sheets(func, args, parser)
+            timings[parser] += time.perf_counter() - start
+            if result != expected:
+                mismatches[parser].append(filename)
+
+    return mismatches, timings
+
+
+if __name__ == "__main__":
+    from dfs_sheet import SOUP_PAGES
+    from player_dfs_sheet import SOURCES
+
+    directory = sys.argv[1] if len(sys.argv) > 1 else "sources"
+    mismatches, timings = check(SOURCES, directory=directory)
+    sheet_mismatches, sheet_timings = check_sheets(SOUP_PAGES)
+    for parser in timings:
+        mismatches[parser] += sheet_mismatches[parser]
+        timings[parser] += sheet_timings[parser]
+    for parser in sorted(timings, key=timings.get):
+        status = "OK" if not mismatches[parser] else "DIFFERS"
+        print("{:12} {:7.3f}s  {}".format(parser, timings[parser], status))
+        for filename in mismatches[parser]:
+            print("    {}".format(filename))
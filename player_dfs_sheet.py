@@ -1,16 +1,31 @@
 import csv
 import json
 import re
+import time
 from os import path
 
 import requests
-from bs4 import BeautifulSoup
+from bs4 import SoupStrainer
 from openpyxl import Workbook
+from openpyxl.comments import Comment
 from openpyxl.formatting.rule import ColorScaleRule
 from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
 from openpyxl.utils import column_index_from_string, get_column_letter
 
+import archive
+import async_fetch
+import fetch
+from fetch import (
+    DAY,
+    HOUR,
+    Source,
+    load_source,
+    parse_sources,
+    prefetch,
+    source_ages,
+)
 from player import DST, QB, RB, TE, WR, Player
+from tables import TableSpec, header_rows, number
 
 
 def style_range(ws, cell_range, border=Border(), fill=None, font=None, alignment=None):
@@ -58,65 +73,6 @@ def create_sheet_header(wb, title, header):
     wb[title].append(header)
 
 
-def pull_soup_data(filename, ENDPOINT):
-    """Either pull file from html or from file."""
-    soup = None
-    if not path.isfile(filename):
-        print(
-            "{} does not exist. Pulling from endpoint [{}]".format(filename, ENDPOINT)
-        )
-        # send GET request
-        r = requests.get(ENDPOINT)
-        status = r.status_code
-
-        # if not successful, raise an exception
-        if status != 200:
-            raise Exception("Requests status != 200. It is: {0}".format(status))
-
-        # dump html to file to avoid multiple requests
-        with open(filename, "w") as outfile:
-            print(r.text, file=outfile)
-
-        soup = BeautifulSoup(r.text, "html5lib")
-    else:
-        print("File exists [{}]. Nice!".format(filename))
-        # load html from file
-        with open(filename, "r") as html_file:
-            soup = BeautifulSoup(html_file, "html5lib")
-
-    return soup
-
-
-def pull_data(filename, ENDPOINT):
-    """Either pull file from API or from file."""
-    data = None
-    if not path.isfile(filename):
-        print(
-            "{} does not exist. Pulling from endpoint [{}]".format(filename, ENDPOINT)
-        )
-        # send GET request
-        r = requests.get(ENDPOINT)
-        status = r.status_code
-
-        # if not successful, raise an exception
-        if status != 200:
-            raise Exception("Requests status != 200. It is: {0}".format(status))
-
-        # store response
-        data = r.json()
-
-        # dump json to file for future use to avoid multiple API pulls
-        with open(filename, "w") as outfile:
-            json.dump(data, outfile)
-    else:
-        print("File exists [{}]. Nice!".format(filename))
-        # load json from file
-        with open(filename, "r") as json_file:
-            data = json.load(json_file)
-
-    return data
-
-
 def massage_name(name):
     """Remove periods, third names, and special fixes for player names."""
     # remove periods from name
@@ -128,208 +84,124 @@ def massage_name(name):
     return name
 
 
-def get_fpros_ecr(position):
-    """Get stats from FantasyPros for each position."""
+def fpros_page(position):
+    """Return the FantasyPros rankings page for a position (PPR for RB/WR/TE)."""
     if position == "QB" or position == "DST":
-        ENDPOINT = "https://www.fantasypros.com/nfl/rankings/{}.php".format(
-            position.lower()
-        )
-    else:
-        ENDPOINT = "https://www.fantasypros.com/nfl/rankings/ppr-{}.php".format(
-            position.lower()
-        )
+        return position.lower()
+    return "ppr-{}".format(position.lower())
 
-    fn = "ecr_{}.html".format(position)
-    dir = "sources"
-    filename = path.join(dir, fn)
 
-    # pull data
-    soup = pull_soup_data(filename, ENDPOINT)
+def ecr_name(cell):
+    # remove periods (T.J. Yeldon, T.Y. Hilton)
+    return cell.text.strip().replace(".", "")
 
-    # find all tables (2) in the html
-    table = soup.find("table", id="rank-data")
 
-    if table:
-        ls = []
-
-        # # find header
-        table_header = table.find("thead")
-        # there is one header row
-        header_row = table_header.find("tr")
-        # loop through header columns and append to worksheet
-        header_cols = header_row.find_all("th")
-        header = [ele.text.strip() for ele in header_cols]
-        ls.append(header)
-
-        # ignore notes
-        header = header[:-1]
-
-        # find the rest of the table header_rows
-        rows = table.find_all("tr")
-        for row in rows:
-            cols = row.find_all("td")
-            # cols = [ele.text.strip() for ele in cols]
-            # change from list comp for just fpros
-            new_cols = []
-            for ele in cols:
-                txt = ele.text.strip()
-                # replace JAX
-                txt = txt.replace("JAC", "JAX")
-                # remove periods (T.J. Yeldon, T.Y. Hilton)
-                txt = txt.replace(".", "")
-                # really? just to fix mitchell tribuski?
-                if position == "QB":
-                    txt = txt.replace("Mitch", "Mitchell")
-                new_cols.append(txt)
+def fix_ecr_text(txt):
+    # replace JAX
+    return txt.replace("JAC", "JAX")
 
-            if cols:
-                ls.append(new_cols)
 
-        # return dict(zip(header, new_cols))
-        return ls
+def fix_qb_ecr_text(txt):
+    # really? just to fix mitchell tribuski?
+    return fix_ecr_text(txt).replace("Mitch", "Mitchell")
 
 
-def get_lineups_player_stats():
-    """Meta function to pull all player stats from lineups.com."""
-    stats = {
-        "snaps": get_lineups_nfl_snaps(),
-        "targets": get_lineups_nfl_targets(),
-        "receptions": get_lineups_nfl_receptions(),
-        "rush_atts": get_lineups_nfl_rush_atts(),
-        "redzone_rushes": get_lineups_nfl_redzone_rush_atts(),
-        "redzone_targets": get_lineups_nfl_redzone_targets(),
-    }
-    return stats
+# the player name is column 2; only it loses its periods, so averages
+# like 2.85 stay numbers
+ECR_TABLE = TableSpec(text=fix_ecr_text, readers={2: ecr_name}, convert=number)
+QB_ECR_TABLE = TableSpec(text=fix_qb_ecr_text, readers={2: ecr_name}, convert=number)
 
 
-def get_lineups_nfl_snaps():
-    """Get players' snaps from lineups.com."""
-    ENDPOINT = "https://api.lineups.com/nfl/fetch/snaps/2018/OFF"
-    fn = "nfl_snaps.json"
-    dir = 'sources'
-    filename = path.join(dir, fn)
+def parse_fpros_ecr(soup, params):
+    """Parse the ECR table from a FantasyPros rankings page.
 
-    # if file doesn't exist, let's pull it. otherwise - use the file.
-    data = pull_data(filename, ENDPOINT)
+    Returns the header followed by every row, as lists of cells.
+    """
+    table = soup.find("table", id="rank-data")
 
-    if data is None:
-        raise Exception("Failed to pull data from API or file.")
+    if table:
+        spec = QB_ECR_TABLE if params["position"] == "QB" else ECR_TABLE
+        return [header_rows(table)[0]] + spec.extract(table)
 
-    # create dictionary and set key to player's full name
-    # dictionary = {}
-    # for player in data['data']:
-    #     dictionary[player['full_name']] = player
 
-    # return dict comprehension for code above
-    return {massage_name(x["full_name"]): x for x in data["data"]}
+def get_fpros_ecr(position):
+    """Get stats from FantasyPros for each position."""
+    return load_source(SOURCES["ecr"], position=position, page=fpros_page(position))
 
 
-def get_lineups_nfl_targets():
-    """Get players' targets from lineups.com."""
-    ENDPOINT = "https://api.lineups.com/nfl/fetch/targets/2018/OFF"
-    fn = "nfl_targets.json"
-    dir = "sources"
-    filename = path.join(dir, fn)
+def get_lineups_player_stats(missing=None):
+    """Meta function to pull all player stats from lineups.com.
 
-    # if file doesn't exist, let's pull it. otherwise - use the file.
-    data = pull_data(filename, ENDPOINT)
+    If missing is a list, stats that fail to load are left empty and
+    their names appended to it instead of raising.
+    """
+    getters = {
+        "snaps": get_lineups_nfl_snaps,
+        "targets": get_lineups_nfl_targets,
+        "receptions": get_lineups_nfl_receptions,
+        "rush_atts": get_lineups_nfl_rush_atts,
+        "redzone_rushes": get_lineups_nfl_redzone_rush_atts,
+        "redzone_targets": get_lineups_nfl_redzone_targets,
+    }
+    if missing is None:
+        return {key: getter() for key, getter in getters.items()}
+    return {key: try_source(missing, key, getter) for key, getter in getters.items()}
 
-    if data is None:
-        raise Exception("Failed to pull data from API or file.")
 
-    # create dictionary and set key to player's full name
-    return {massage_name(x["full_name"]): x for x in data["data"]}
+def parse_lineups_by_full_name(players, params):
+    """Create dictionary from lineups.com data keyed by player's full name."""
+    return {massage_name(x["full_name"]): x for x in players}
 
 
-def get_lineups_nfl_receptions():
-    """Get players' receptions from lineups.com."""
-    ENDPOINT = "https://api.lineups.com/nfl/fetch/receptions/2018/OFF"
-    fn = "nfl_receptions.json"
-    dir = "sources"
-    filename = path.join(dir, fn)
+def parse_lineups_by_name(players, params):
+    """Create dictionary from lineups.com data keyed by player's name."""
+    return {massage_name(x["name"]): x for x in players}
 
-    # if file doesn't exist, let's pull it. otherwise - use the file.
-    data = pull_data(filename, ENDPOINT)
 
-    if data is None:
-        raise Exception("Failed to pull data from API or file.")
+def get_lineups_nfl_snaps():
+    """Get players' snaps from lineups.com."""
+    return load_source(SOURCES["snaps"], season=SEASON)
 
-    # create dictionary and set key to player's full name
-    return {massage_name(x["name"]): x for x in data["data"]}
 
+def get_lineups_nfl_targets():
+    """Get players' targets from lineups.com."""
+    return load_source(SOURCES["targets"], season=SEASON)
 
-def get_lineups_nfl_rush_atts():
-    """Get players' rush attempts from lineups.com."""
-    ENDPOINT = "https://api.lineups.com/nfl/fetch/rush/2018/OFF"
-    fn = "nfl_rush_atts.json"
-    dir = "sources"
-    filename = path.join(dir, fn)
 
-    # if file doesn't exist, let's pull it. otherwise - use the file.
-    data = pull_data(filename, ENDPOINT)
+def get_lineups_nfl_receptions():
+    """Get players' receptions from lineups.com."""
+    return load_source(SOURCES["receptions"], season=SEASON)
 
-    if data is None:
-        raise Exception("Failed to pull data from API or file.")
 
-    # create dictionary and set key to player's full name
-    return {massage_name(x["name"]): x for x in data["data"]}
+def get_lineups_nfl_rush_atts():
+    """Get players' rush attempts from lineups.com."""
+    return load_source(SOURCES["rush_atts"], season=SEASON)
 
 
 def get_lineups_nfl_redzone_rush_atts():
     """Get players' red zone rush attempts from lineups.com."""
-    ENDPOINT = "https://api.lineups.com/nfl/fetch/redzone-rush/2018/OFF"
-    fn = "nfl_redzone_rushes.json"
-    dir = "sources"
-    filename = path.join(dir, fn)
-
-    # if file doesn't exist, let's pull it. otherwise - use the file.
-    data = pull_data(filename, ENDPOINT)
-
-    if data is None:
-        raise Exception("Failed to pull data from API or file.")
-
-    # create dictionary and set key to player's full name
-    return {massage_name(x["name"]): x for x in data["data"]}
+    return load_source(SOURCES["redzone_rushes"], season=SEASON)
 
 
 def get_lineups_nfl_redzone_targets():
-    """Get players' snaps information from lineups.com."""
+    """Get players' red zone targets (RB, WR and TE) from lineups.com."""
     red_zone_targets = {}
-    for position in ["RB", "WR", "TE"]:
-        ENDPOINT = "https://api.lineups.com/nfl/fetch/redzone-targets/2018/{}".format(
-            position
-        )
-        fn = "nfl_redzone_targets_{}.json".format(position)
-        dir = "sources"
-        filename = path.join(dir, fn)
-
-        # if file doesn't exist, let's pull it. otherwise - use the file.
-        data = pull_data(filename, ENDPOINT)
-
-        if data is None:
-            raise Exception("Failed to pull data from API or file.")
-
-        red_zone_targets.update({massage_name(x["full_name"]): x for x in data["data"]})
-    # create dictionary and set key to player's full name
+    for params in SOURCES["redzone_targets"].params:
+        red_zone_targets.update(load_source(SOURCES["redzone_targets"], **params))
     return red_zone_targets
 
 
 def get_nfl_def_stats(wb):
     """Get teams' defensive stats from lineups.com."""
+    return load_source(SOURCES["def_stats"])
+
+
+def parse_nfl_def_stats(teams, params):
+    """Parse teams' defensive stats from lineups.com."""
     # https://www.lineups.com/nfl/teams/stats/defense-stats
     # get passing yds/att
     # td / att (td %)
     # att / completion (compl %)
-    ENDPOINT = "https://api.lineups.com/nfl/fetch/teams/stats/defense-stats/current"
-    fn = "nfl_def_stats.json"
-    dir = "sources"
-    filename = path.join(dir, fn)
-
-    # if file doesn't exist, let's pull it. otherwise - use the file.
-    data = pull_data(filename, ENDPOINT)
-
-    # we just want player data
-    player_data = data["data"]
 
     header = [
         "team abbv",
@@ -379,7 +251,7 @@ def get_nfl_def_stats(wb):
         "Baltimore Ravens": "BAL",
     }
     dictionary = {}
-    for d in player_data:
+    for d in teams:
         # TODO rushing_attempt_percentage_by_week
         team = d["team"]
         team_abbv = team_map[team]
@@ -390,9 +262,9 @@ def get_nfl_def_stats(wb):
         pass_yds = d["passing_yards"]
         pass_tds = d["passing_touchdowns"]
 
-        # personal
-        pass_td_per_att_perc = "{0:.4f}".format(pass_tds / pass_att)
-        compl_perc = "{0:.4f}".format(pass_compls / pass_att)
+        # personal (fractions)
+        pass_td_per_att_perc = pass_tds / pass_att
+        compl_perc = pass_compls / pass_att
 
         # remove '.' from name
         # name = name.replace('.', '')
@@ -442,44 +314,49 @@ def conv_weeks_to_padded_list(weeks):
 
 def get_vegas_rg(wb):
     """Pull Vegas totals/lines/spreads from RotoGrinders."""
-    ENDPOINT = "https://rotogrinders.com/schedules/nfl"
-    fn = "vegas_script.html"
-    dir = "sources"
-    filename = path.join(dir, fn)
-
-    # pull data
-    soup = pull_soup_data(filename, ENDPOINT)
-
-    # find script(s) in the html
-    script = soup.findAll("script")
-
-    # for i, s in enumerate(script):
-    #     print(i)
-    #     print(s.string)
-
-    js_vegas_data = script[12].string
-    # print(js_vegas_data)
-
-    # replace two-letter abbvs
-    js_vegas_data = js_vegas_data.replace("GBP", "GB")
-    js_vegas_data = js_vegas_data.replace("JAC", "JAX")
-    js_vegas_data = js_vegas_data.replace("KCC", "KC")
-    js_vegas_data = js_vegas_data.replace("NEP", "NE")
-    js_vegas_data = js_vegas_data.replace("NOS", "NO")
-    js_vegas_data = js_vegas_data.replace("SFO", "SF")
-    js_vegas_data = js_vegas_data.replace("TBB", "TB")
-
-    # pull json object from data variable
-    pattern = re.compile(r"data = (.*);")
-    json_str = pattern.search(js_vegas_data).group(1)
-    vegas_json = json.loads(json_str)
+    return load_source(SOURCES["vegas"])
+
+
+# RotoGrinders team codes that differ from DraftKings'
+RG_TEAM_CODES = {
+    "GBP": "GB",
+    "JAC": "JAX",
+    "KCC": "KC",
+    "NEP": "NE",
+    "NOS": "NO",
+    "SFO": "SF",
+    "TBB": "TB",
+}
+
+
+def parse_vegas_rg(text, params):
+    """Parse Vegas totals/lines/spreads from the RotoGrinders schedule page.
+
+    The schedule is a json array assigned to a `data` variable in one of the
+    page's scripts, so it is pulled out of the raw html with a regex rather
+    than by building a DOM and picking a script by position.
+    """
+    vegas_json = None
+    for match in re.finditer(r"data = (.*);", text):
+        try:
+            data = json.loads(match.group(1))
+        except ValueError:
+            continue
+        # the schedule is the list of matchups keyed by team
+        if isinstance(data, list) and data and "team" in data[0]:
+            vegas_json = data
+            break
+
+    if vegas_json is None:
+        raise Exception("Failed to find Vegas data in RotoGrinders page.")
 
     vegas = {}
     # iterate through json
     for matchup in vegas_json:
-        vegas[matchup["team"]] = {
+        team = RG_TEAM_CODES.get(matchup["team"], matchup["team"])
+        vegas[team] = {
             "display_time": matchup["time"]["display"],
-            "opponent": matchup["opponent"],
+            "opponent": RG_TEAM_CODES.get(matchup["opponent"], matchup["opponent"]),
             "line": matchup["line"],
             "moneyline": matchup["moneyline"],
             "overunder": matchup["overunder"],
@@ -490,207 +367,144 @@ def get_vegas_rg(wb):
 
 
 def get_dvoa_rankings(wb):
-    """Get DVOA rankings for team defenses from FootballOutsiders.
-
-    There are two additional get_dvoa_team functions for the resulting tables.
-    """
-    ENDPOINT = "https://www.footballoutsiders.com/stats/teamdef"
-    fn = "html_defense.html"
-    dir = "sources"
-    filename = path.join(dir, fn)
+    """Get DVOA rankings for team defenses from FootballOutsiders."""
+    return load_source(SOURCES["dvoa"])
 
-    # pull data
-    soup = pull_soup_data(filename, ENDPOINT)
 
-    # find all tables (3) in the html
-    table = soup.findAll("table")
+def parse_dvoa_rankings(tables, params):
+    """Parse DVOA rankings for team defenses from FootballOutsiders.
 
-    if table:
-        dict_team_rankings = get_dvoa_team_rankings(wb, table[0])
+    tables are the page's first two tables, extracted (see SOURCES).
+    There are two additional get_dvoa functions to merge them.
+    """
+    if tables:
+        dict_team_rankings = get_dvoa_team_rankings(tables[0])
         # separate function for second table
-        dict_dvoa_rankings_all = get_dvoa_recv_rankings(
-            wb, table[1], dict_team_rankings
-        )
+        dict_dvoa_rankings_all = get_dvoa_recv_rankings(tables[1], dict_team_rankings)
 
         return dict_dvoa_rankings_all
 
 
-def get_dvoa_team_rankings(wb, soup_table):
+# na = non-adjusted
+DVOA_TEAM_TABLE = TableSpec(
+    [
+        "row_num",
+        "defense_dvoa",
+        "last_week",
+        "defense_dave",
+        "total_def_rank",
+        "pass_def",
+        "pass_def_rank",
+        "rush_def",
+        "rush_def_rank",
+        "na_total",
+        "na_pass",
+        "na_rush",
+        "var",
+        "sched",
+        "rank",
+    ],
+    key=1,
+    convert=number,
+)
+
+# VS types of receivers
+DVOA_RECV_TABLE = TableSpec(
+    [
+        "rank",
+        "wr1_dvoa",
+        "wr1_rank",
+        "wr1_pa_g",
+        "wr1_yd_g",
+        "wr2_dvoa",
+        "wr2_rank",
+        "wr2_pa_g",
+        "wr2_yd_g",
+        "wro_dvoa",
+        "wro_rank",
+        "wro_pa_g",
+        "wro_yd_g",
+        "te_dvoa",
+        "te_rank",
+        "te_pa_g",
+        "te_yd_g",
+        "rb_dvoa",
+        "rb_rank",
+        "rb_pa_g",
+        "rb_yd_g",
+    ],
+    key=1,
+    convert=number,
+)
+
+
+def get_dvoa_team_rankings(team_table):
     """Get rankings from first table in HTML."""
-    defense_stats = soup_table
-
-    # find header
-    # table_header = defense_stats.find('thead')
-    # there is one header row
-    # header_row = table_header.find('tr')
-    # loop through header columns and append to worksheet
-    # header_cols = header_row.find_all('th')
-    # header = [ele.text.strip() for ele in header_cols]
-
-    # find the rest of the table header_rows
-    rows = defense_stats.find_all("tr")
-
-    dvoa_team_rankings = {}
-
     # make blank NFL key
-    dvoa_team_rankings["NFL"] = {}
-    for row in rows:
-        cols = row.find_all("td")
-        cols = [ele.text.strip() for ele in cols]
-
-        if cols:
-            # pop 'team_abbv' for dict key
-            key = cols.pop(1)
-
-            # na = non-adjusted
-            key_names = [
-                "row_num",
-                "defense_dvoa",
-                "last_week",
-                "defense_dave",
-                "total_def_rank",
-                "pass_def",
-                "pass_def_rank",
-                "rush_def",
-                "rush_def_rank",
-                "na_total",
-                "na_pass",
-                "na_rush",
-                "var",
-                "sched",
-                "rank",
-            ]
-            # print(key)
-            # map key_names to cols
-            dvoa_team_rankings[key] = dict(zip(key_names, cols))
+    dvoa_team_rankings = {"NFL": {}}
+    # copies, since the receiver rankings are added to them
+    for key, rankings in team_table.items():
+        dvoa_team_rankings[key] = dict(rankings)
     return dvoa_team_rankings
 
 
-def get_dvoa_recv_rankings(wb, soup_table, dict_team_rankings):
+def get_dvoa_recv_rankings(recv_table, dict_team_rankings):
     """Get rankings from second table in HTML (vs. WR1, WR2, etc.)."""
-    # VS types of receivers
-    def_recv_stats = soup_table
-    # table_header = def_recv_stats.find('thead')
-    # header_rows = table_header.find_all('tr')
-
-    rows = def_recv_stats.find_all("tr")
-    for row in rows:
-        cols = row.find_all("td")
-        cols = [ele.text.strip() for ele in cols]
-
-        if cols:
-            # pop 'team_abbv' for dict key
-            key = cols.pop(1)
-
-            key_names = [
-                "rank",
-                "wr1_dvoa",
-                "wr1_rank",
-                "wr1_pa_g",
-                "wr1_yd_g",
-                "wr2_dvoa",
-                "wr2_rank",
-                "wr2_pa_g",
-                "wr2_yd_g",
-                "wro_dvoa",
-                "wro_rank",
-                "wro_pa_g",
-                "wro_yd_g",
-                "te_dvoa",
-                "te_rank",
-                "te_pa_g",
-                "te_yd_g",
-                "rb_dvoa",
-                "rb_rank",
-                "rb_pa_g",
-                "rb_yd_g",
-            ]
-            # print(key)
-
-            # map key_names to cols
-            dict_team_rankings[key].update(dict(zip(key_names, cols)))
-
+    for key, rankings in recv_table.items():
+        dict_team_rankings[key].update(rankings)
     return dict_team_rankings
 
 
 def get_line_rankings(wb):
     """Get offensive and defensive line rankings from FootballOutsiders."""
-    dir = "sources"
     # create empty dict to return
     dictionary = {}
-    # dictionary['dl'] = {}
-    for line in ["ol", "dl"]:
-        ENDPOINT = "https://www.footballoutsiders.com/stats/{0}".format(line)
-        fn = "html_{0}.html".format(line)
-        filename = path.join(dir, fn)
-
-        # create dict for run and pass stats
-        dictionary[line] = {}
-        dictionary[line]["run"] = {}
-        dictionary[line]["pass"] = {}
-        # print(dictionary[line]['run'])
-
-        # pull data
-        soup = pull_soup_data(filename, ENDPOINT)
-
-        # find all tables (2) in the html
-        table = soup.findAll("table")
-
-        if table:
-            # store table
-            line_stats = table[0]
-            # find header
-            # table_header = line_stats.find('thead')
-            # there is one header row
-            # header_row = table_header.find('tr')
-            # loop through header columns and append to worksheet
-            # header_cols = header_row.find_all('th')
-            # header = [ele.text.strip() for ele in header_cols]
-
-            # find the rest of the table header_rows
-            rows = line_stats.find_all("tr")
-            for row in rows:
-                cols = row.find_all("td")
-                cols = [ele.text.strip() for ele in cols]
-                if cols:
-
-                    # pop 'team_abbv' for dict key
-                    run_key = cols.pop(1)
-
-                    # pop 'team_abbv' for pass protection
-                    # pass_key = cols.pop(11)
-
-                    run_key_names = [
-                        "rank",
-                        "adj_line_yds",
-                        "rb_yds",
-                        "power_succ_perc",
-                        "power_rank",
-                        "stuff_perc",
-                        "stuff_rank",
-                        "2nd_lvl_yds",
-                        "2nd_lvl_rank",
-                        "open_field_yds",
-                        "open_field_rank",
-                    ]
-
-                    pass_key_names = ["rank", "sacks", "adj_sack_rate"]
-                    # print(key)
-
-                    # map o-line to 'run' key
-                    dictionary[line]["run"][run_key] = dict(zip(run_key_names, cols))
-                    # map d-line to 'pass' key
-                    # dictionary[line]['pass'][pass_key] = dict(
-                    # zip(pass_key_names, cols[-3:]))
-                    dictionary[line]["pass"][run_key] = dict(
-                        zip(pass_key_names, cols[-3:])
-                    )
-                    # example
-                    # dictionary['ol']['run']['LAR']['adj_line_yds'] = 6.969
-                    # dictionary['dl']['pass']['MIA']['adj_sack_rate'] = 4.5%
+    for params in SOURCES["line"].params:
+        dictionary[params["line"]] = load_source(SOURCES["line"], **params)
     return dictionary
 
 
+# o-line run blocking, keyed by team
+LINE_RUN_TABLE = TableSpec(
+    [
+        "rank",
+        "adj_line_yds",
+        "rb_yds",
+        "power_succ_perc",
+        "power_rank",
+        "stuff_perc",
+        "stuff_rank",
+        "2nd_lvl_yds",
+        "2nd_lvl_rank",
+        "open_field_yds",
+        "open_field_rank",
+    ],
+    key=1,
+    convert=number,
+)
+
+# pass protection, the last three columns of the same rows
+LINE_PASS_TABLE = TableSpec(
+    ["rank", "sacks", "adj_sack_rate"], key=1, start=-3, convert=number
+)
+
+
+def extract_line_rankings(table):
+    """Extract run and pass rankings from the table of a line page."""
+    rows = LINE_RUN_TABLE.read_rows(table)
+    return {"run": LINE_RUN_TABLE.build(rows), "pass": LINE_PASS_TABLE.build(rows)}
+
+
+def parse_line_rankings(tables, params):
+    """Parse run and pass rankings from a FootballOutsiders line page."""
+    # example
+    # dictionary['ol']['run']['LAR']['adj_line_yds'] = 6.969
+    # dictionary['dl']['pass']['MIA']['adj_sack_rate'] = 0.045
+    if not tables:
+        return {"run": {}, "pass": {}}
+    return tables[0]
+
+
 def get_matchup_info(game_info, team_abbv):
     """Parse game info into a nice string (home vs. away)."""
     # split game info into matchup_info
@@ -755,148 +569,267 @@ def qb_map(key):
 
 
 def get_qb_stats_FO(wb):
-    """Get QB stats from FootballOutsidersself.
-
-    There are three separate tables that need to be parsed.
+    """Get QB stats from FootballOutsiders."""
+    return load_source(SOURCES["qb"])
+
+
+# i only create this list because Lamar Jackson has no pass_dyar but he has rushing stats
+# also Nathan Peterman has no rushing yds..
+QB_FIELDS = [
+    "team",
+    "pass_dyar",
+    "dyar_rank",
+    "yar",
+    "yar_rank",
+    "pass_dvoa",
+    "pass_dvoa_rank",
+    "voa",
+    "qbr",
+    "qbr_rank",
+    "pass_atts",
+    "pass_yds",
+    "eyds",
+    "tds",
+    "fk",
+    "fl",
+    "int",
+    "c_perc",
+    "dpi",
+    "alex",
+    "rush_dyar",
+    "rush_dyar_rank",
+    "rush_yar",
+    "rush_yar_rank",
+    "rush_dvoa",
+    "rush_dvoa_rank",
+    "rush_voa",
+    "rush_atts",
+    "rush_yds",
+    "rush_eyds",
+    "rush_tds",
+    "fumbles",
+]
+
+# passing (qualified), passing (fewer attempts) and rushing, keyed by name
+QB_TABLES = [
+    TableSpec(
+        QB_FIELDS[:20],
+        key=0,
+        convert=number,
+        key_func=qb_map,
+    ),
+    TableSpec(
+        ["team", "pass_dyar"] + QB_FIELDS[5:20],
+        key=0,
+        convert=number,
+        key_func=qb_map,
+    ),
+    TableSpec(
+        ["team"] + QB_FIELDS[20:],
+        key=0,
+        convert=number,
+        key_func=qb_map,
+    ),
+]
+
+
+def parse_qb_stats_FO(tables, params):
+    """Parse QB stats from FootballOutsiders.
+
+    There are three separate tables, extracted by QB_TABLES, to merge.
     """
-    ENDPOINT = "https://www.footballoutsiders.com/stats/qb"
-    fn = "html_qb.html"
-    dir = "sources"
-    filename = path.join(dir, fn)
-
-    # pull data
-    soup = pull_soup_data(filename, ENDPOINT)
-
-    # find all tables (3) in the html
-    table = soup.findAll("table")
-
-    if table:
+    if tables:
         dictionary = {}
-        for i, t in enumerate(table):
-            # find header
-            table_header = t.find("thead")
-            # there is one header row
-            header_row = table_header.find("tr")
-            # loop through header columns and append to worksheet
-            header_cols = header_row.find_all("th")
-            header = [ele.text.strip() for ele in header_cols]
-
-            # find the rest of the table header_rows
-            rows = t.find_all("tr")
-            for row in rows:
-                cols = row.find_all("td")
-                cols = [ele.text.strip().replace(",", "") for ele in cols]
-                if cols:
-                    # pop 'name' for dict key
-                    key = cols.pop(0)
-
-                    # i only create this list because Lamar Jackson has no pass_dyar but he has rushing stats
-                    # also Nathan Peterman has no rushing yds..
-                    main_fields = [
-                        "team",
-                        "pass_dyar",
-                        "dyar_rank",
-                        "yar",
-                        "yar_rank",
-                        "pass_dvoa",
-                        "pass_dvoa_rank",
-                        "voa",
-                        "qbr",
-                        "qbr_rank",
-                        "pass_atts",
-                        "pass_yds",
-                        "eyds",
-                        "tds",
-                        "fk",
-                        "fl",
-                        "int",
-                        "c_perc",
-                        "dpi",
-                        "alex",
-                        "rush_dyar",
-                        "rush_dyar_rank",
-                        "rush_yar",
-                        "rush_yar_rank",
-                        "rush_dvoa",
-                        "rush_dvoa_rank",
-                        "rush_voa",
-                        "rush_atts",
-                        "rush_yds",
-                        "rush_eyds",
-                        "rush_tds",
-                        "fumbles",
-                    ]
-                    if i == 0:
-                        key_names = [
-                            "team",
-                            "pass_dyar",
-                            "dyar_rank",
-                            "yar",
-                            "yar_rank",
-                            "pass_dvoa",
-                            "pass_dvoa_rank",
-                            "voa",
-                            "qbr",
-                            "qbr_rank",
-                            "pass_atts",
-                            "pass_yds",
-                            "eyds",
-                            "tds",
-                            "fk",
-                            "fl",
-                            "int",
-                            "c_perc",
-                            "dpi",
-                            "alex",
-                        ]
-                    elif i == 1:
-                        key_names = [
-                            "team",
-                            "pass_dyar",
-                            "pass_dvoa",
-                            "pass_dvoa_rank",
-                            "voa",
-                            "qbr",
-                            "qbr_rank",
-                            "pass_atts",
-                            "pass_yds",
-                            "eyds",
-                            "tds",
-                            "fk",
-                            "fl",
-                            "int",
-                            "c_perc",
-                            "dpi",
-                            "alex",
-                        ]
-                    elif i == 2:
-                        key_names = [
-                            "team",
-                            "rush_dyar",
-                            "rush_dyar_rank",
-                            "rush_yar",
-                            "rush_yar_rank",
-                            "rush_dvoa",
-                            "rush_dvoa_rank",
-                            "rush_voa",
-                            "rush_atts",
-                            "rush_yds",
-                            "rush_eyds",
-                            "rush_tds",
-                            "fumbles",
-                        ]
+        for table in tables:
+            for player_name, stats in table.items():
+                # create dictionary if it does not exist
+                if player_name not in dictionary:
+                    dictionary[player_name] = dict.fromkeys(QB_FIELDS, None)
+                dictionary[player_name].update(stats)
+        return dictionary
 
-                    # print(key)
-                    # map key_names to cols
 
-                    player_name = qb_map(key)
-                    # create dictionary if it does not exist
-                    if player_name not in dictionary:
-                        dictionary[player_name] = dict.fromkeys(main_fields, None)
-                    dictionary[player_name].update(dict(zip(key_names, cols)))
+SEASON = 2018
+WEEK = 11
+POSITIONS = ["QB", "RB", "WR", "TE", "DST"]
+
+# the fields main() reads of each player's lineups.com stats
+LINEUPS_FIELDS = ["average", "weeks"]
+
+# every source main() reads, with its URL/cache file templates and TTL
+SOURCES = {
+    "ecr": Source(
+        "https://www.fantasypros.com/nfl/rankings/{page}.php",
+        "ecr_{position}.html",
+        parse_fpros_ecr,
+        ttl=6 * HOUR,
+        params=[{"position": pos, "page": fpros_page(pos)} for pos in POSITIONS],
+        version=2,
+        parse_only=SoupStrainer("table", id="rank-data"),
+    ),
+    "vegas": Source(
+        "https://rotogrinders.com/schedules/nfl",
+        "vegas_script.html",
+        parse_vegas_rg,
+        ttl=HOUR,
+        kind="text",
+    ),
+    "snaps": Source(
+        "https://api.lineups.com/nfl/fetch/snaps/{season}/OFF",
+        "nfl_snaps.json",
+        parse_lineups_by_full_name,
+        ttl=DAY,
+        kind="items",
+        params=[{"season": SEASON}],
+        version=2,
+        parse_only=["full_name", "season_snap_percent", "snap_percentage_by_week"],
+    ),
+    "targets": Source(
+        "https://api.lineups.com/nfl/fetch/targets/{season}/OFF",
+        "nfl_targets.json",
+        parse_lineups_by_full_name,
+        ttl=DAY,
+        kind="items",
+        params=[{"season": SEASON}],
+        version=2,
+        parse_only=["full_name"] + LINEUPS_FIELDS,
+    ),
+    "receptions": Source(
+        "https://api.lineups.com/nfl/fetch/receptions/{season}/OFF",
+        "nfl_receptions.json",
+        parse_lineups_by_name,
+        ttl=DAY,
+        kind="items",
+        params=[{"season": SEASON}],
+        version=2,
+        parse_only=["name"] + LINEUPS_FIELDS,
+    ),
+    "rush_atts": Source(
+        "https://api.lineups.com/nfl/fetch/rush/{season}/OFF",
+        "nfl_rush_atts.json",
+        parse_lineups_by_name,
+        ttl=DAY,
+        kind="items",
+        params=[{"season": SEASON}],
+        version=2,
+        parse_only=["name"] + LINEUPS_FIELDS,
+    ),
+    "redzone_rushes": Source(
+        "https://api.lineups.com/nfl/fetch/redzone-rush/{season}/OFF",
+        "nfl_redzone_rushes.json",
+        parse_lineups_by_name,
+        ttl=DAY,
+        kind="items",
+        params=[{"season": SEASON}],
+        version=2,
+        parse_only=["name"] + LINEUPS_FIELDS,
+    ),
+    "redzone_targets": Source(
+        "https://api.lineups.com/nfl/fetch/redzone-targets/{season}/{position}",
+        "nfl_redzone_targets_{position}.json",
+        parse_lineups_by_full_name,
+        ttl=DAY,
+        kind="items",
+        params=[{"season": SEASON, "position": pos} for pos in ["RB", "WR", "TE"]],
+        version=2,
+        parse_only=["full_name"] + LINEUPS_FIELDS,
+    ),
+    "def_stats": Source(
+        "https://api.lineups.com/nfl/fetch/teams/stats/defense-stats/current",
+        "nfl_def_stats.json",
+        parse_nfl_def_stats,
+        ttl=DAY,
+        kind="items",
+        version=3,
+        parse_only=[
+            "team",
+            "passing_attempts",
+            "passing_yards_per_attempt",
+            "passing_completions",
+            "passing_yards_per_completion",
+            "passing_yards",
+            "passing_touchdowns",
+        ],
+    ),
+    "dvoa": Source(
+        "https://www.footballoutsiders.com/stats/teamdef",
+        "html_defense.html",
+        parse_dvoa_rankings,
+        ttl=7 * DAY,
+        kind="tables",
+        version=3,
+        tables=[DVOA_TEAM_TABLE.extract, DVOA_RECV_TABLE.extract],
+    ),
+    "line": Source(
+        "https://www.footballoutsiders.com/stats/{line}",
+        "html_{line}.html",
+        parse_line_rankings,
+        ttl=7 * DAY,
+        kind="tables",
+        params=[{"line": "ol"}, {"line": "dl"}],
+        version=3,
+        tables=[extract_line_rankings],
+    ),
+    "qb": Source(
+        "https://www.footballoutsiders.com/stats/qb",
+        "html_qb.html",
+        parse_qb_stats_FO,
+        ttl=7 * DAY,
+        kind="tables",
+        version=3,
+        tables=[spec.extract for spec in QB_TABLES],
+    ),
+}
+
+
+# header columns filled from each source, marked when a source is left out
+SOURCE_COLUMNS = {
+    "vegas": ["Total", "O/U", "Line"],
+    "snaps": ["Snap%"],
+    "targets": ["Trgts"],
+    "receptions": ["Rcpts"],
+    "rush_atts": ["Rush ATTs"],
+    "redzone_rushes": ["RZ Opps"],
+    "redzone_targets": ["RZ Opps"],
+    "def_stats": ["Def Yds/Att", "Def Comp%", "Def TD%"],
+    "dvoa": ["Run DVOA", "Pass DVOA", "vs. WR1", "vs. WR2", "vs. TE"],
+    "line": ["O-Line", "D-Line", "O-Line Sack%", "D-Line Sack%"],
+    "qb": ["Rush Yards", "DYAR", "QBR"],
+}
+
+
+# why a source can be left out: it could not be fetched (in time) and
+# there is no cached copy of it; anything else is a bug and is raised
+UNAVAILABLE = (fetch.DeadlineExceeded, requests.RequestException, FileNotFoundError)
+
+
+def try_source(missing, name, func, *args):
+    """Load a source with func(*args), or note it in missing and return {}.
+
+    Only a source that is UNAVAILABLE is left out.
+    """
+    try:
+        return func(*args)
+    except UNAVAILABLE as ex:
+        print("Leaving out {} ({})".format(name, ex))
+        missing.append(name)
+        return {}
+
+
+def lookup(dictionary, *keys):
+    """Return dictionary[key1][key2]..., or None if any key is not there."""
+    for key in keys:
+        if not isinstance(dictionary, dict) or key not in dictionary:
+            return None
+        dictionary = dictionary[key]
     return dictionary
 
 
+def get_sources():
+    """List (filename, endpoint, ttl) for every source main() reads."""
+    return [entry for source in SOURCES.values() for entry in source.expand()]
+
+
 def find_name_in_ecr(ecr_pos_list, name):
     for item in ecr_pos_list:
         # if any(name in s for s in item):
@@ -1009,21 +942,21 @@ def excel_insert_ranks(wb):
         # look through header row and pull header columns
         for col in ws[header_row_num]:
             if col.value == "ECR":
-                ecr_col = col.column
+                ecr_col = col.column_letter
             elif col.value == "ECR Data":
-                ecr_data_col = col.column
+                ecr_data_col = col.column_letter
             elif col.value == "Salary":
-                salary_col = col.column
+                salary_col = col.column_letter
             elif col.value == "Salary Rank":
-                salary_rank_col = col.column
+                salary_rank_col = col.column_letter
             elif col.value == "+/- Rank":
-                plus_minus_col = col.column
+                plus_minus_col = col.column_letter
             elif col.value == "FD Salary":
-                fd_salary_col = col.column
+                fd_salary_col = col.column_letter
             elif col.value == "FDraft Salary Rank":
-                fd_salary_rank_col = col.column
+                fd_salary_rank_col = col.column_letter
             elif col.value == "FD +/- Rank":
-                fd_plus_minus_col = col.column
+                fd_plus_minus_col = col.column_letter
 
         # ECR rank
         for cell in ws[ecr_col]:
@@ -1208,7 +1141,9 @@ def excel_apply_borders(wb):
         # select worksheet
         ws = wb[position]
         # find header columns (None = empty cell)
-        fields = [cell.column for cell in ws[header_row] if cell.value is not None]
+        fields = [
+            cell.column_letter for cell in ws[header_row] if cell.value is not None
+        ]
         # for cell in ws[1]:
         #     if cell.value is not None:
         #         fields.append(cell.column)
@@ -1277,13 +1212,13 @@ def excel_apply_cell_number_formats(wb):
         # apply percentage format to percent fields
         columns_perc = find_fields_in_header(ws, percentage_fields)
         for column in columns_perc:
-            for cell in ws[column]:
+            for cell in ws[get_column_letter(column)]:
                 cell.number_format = "##0.0%"
 
         # apply dollar format to salary fields
         columns_currency = find_fields_in_header(ws, currency_fields)
         for column in columns_currency:
-            for cell in ws[column]:
+            for cell in ws[get_column_letter(column)]:
                 cell.number_format = "$#,##0_);($#,##0)"
 
 
@@ -1383,7 +1318,7 @@ def excel_apply_conditional_formatting(wb):
         # color ranges
         for i in range(1, ws.max_column + 1):
             column_letter = get_column_letter(i)
-            cell_rng = "{0}{1}:{2}".format(column_letter, start_row, ws.max_row)
+            cell_rng = "{0}{1}:{0}{2}".format(column_letter, start_row, ws.max_row)
             if ws.cell(row=2, column=i).value in green_to_red_headers:
                 # color range (green to red)
                 ws.conditional_formatting.add(cell_rng, green_to_red_rule)
@@ -1402,7 +1337,7 @@ def excel_apply_hide_columns(wb):
         ws = wb[position]
         for col in ws[header_row_num]:
             if col.value in hidden_columns:
-                ws.column_dimensions[col.column].hidden = True
+                ws.column_dimensions[col.column_letter].hidden = True
 
 
 def excel_apply_header_freeze(wb):
@@ -1426,6 +1361,55 @@ def excel_apply_filter_setup(wb):
         ws.auto_filter.ref = filter_rng
 
 
+def excel_write_source_ages(wb, ages, peaks=None):
+    """Write a SOURCES sheet listing when each input was fetched.
+
+    peaks ({filename: bytes}, see fetch.parse_peaks) adds the peak memory
+    each source took to parse, for those parsed in this run.
+    """
+    title = "SOURCES"
+    header = ["Source", "URL", "Fetched", "Age (h)", "Stale"]
+    if peaks:
+        header.append("Parse peak (MB)")
+    create_sheet_header(wb, title, header)
+    ws = wb[title]
+    for source in ages:
+        if source["fetched_at"] is None:
+            row = [source["filename"], source["url"], None, None, "missing"]
+        else:
+            fetched = time.strftime(
+                "%Y-%m-%d %H:%M", time.localtime(source["fetched_at"])
+            )
+            row = [
+                source["filename"],
+                source["url"],
+                fetched,
+                round(source["age"] / HOUR, 1),
+                "yes" if source["stale"] else "no",
+            ]
+        if peaks and source["filename"] in peaks:
+            row.append(round(peaks[source["filename"]] / 1024 / 1024, 1))
+        ws.append(row)
+    ws.column_dimensions["A"].width = 40
+    ws.column_dimensions["B"].width = 80
+    ws.column_dimensions["C"].width = 18
+
+
+def excel_mark_missing_columns(wb, missing):
+    """Highlight the header of every column whose source was left out."""
+    fill = PatternFill(start_color="FFFF7C80", end_color="FFFF7C80", fill_type="solid")
+    header_row = 2
+    for position in ["QB", "RB", "WR", "TE", "DST"]:
+        ws = wb[position]
+        for name in missing:
+            for column in find_fields_in_header(ws, SOURCE_COLUMNS.get(name, [])):
+                cell = ws.cell(row=header_row, column=column)
+                cell.fill = fill
+                cell.comment = Comment(
+                    "Source unavailable: {}".format(name), "dfs_sheet"
+                )
+
+
 def excel_apply_sheet_order(wb):
     """Re-order sheet tabs using private variable."""
     # pull indices from QB, RB, WR, TE, DST to be ordered first
@@ -1437,7 +1421,12 @@ def excel_apply_sheet_order(wb):
     wb._sheets = [wb._sheets[i] for i in order]
 
 
-def main():
+def main(
+    fetch_backend="threads",
+    stale_while_revalidate=False,
+    deadline=None,
+    trace_memory=False,
+):
     fn = "DKSalaries_week11_full.csv"
     fdraft_csv = "FDraft_week11_full.csv"
     dest_filename = "player_sheet.xlsx"
@@ -1453,35 +1442,67 @@ def main():
     # dict  of players (key = DFS player name)
     # player_dict = {}
 
-    # make sources dir if it does not exist
-    # directory = 'sources'
-    # if not path.exists(directory):
-    #     makedirs(directory)
-
-    # pull positional stats from fantasypros.com
-    ecr_pos_dict = {}
-    # for position in ['QB', 'RB', 'WR', 'TE', 'DST']:
-    for position in ["QB", "RB", "WR", "TE", "DST"]:
-        ecr_pos_dict[position] = get_fpros_ecr(position)
-
-    # check if Fantasy Draft salary sheet exists
-    if path.exists(fdraft_csv):
-        fdraft_dict = read_fantasy_draft_csv(fdraft_csv)
-    else:
-        fdraft_dict = None
-
-    # vegas lines from rotogrinders.com
-    vegas_dict = get_vegas_rg(wb)
-    # get snaps, targets, receptions, rush attempts from lineups.com
-    stats_dict = get_lineups_player_stats()
-    # defense stats from lineups.com
-    def_dict = get_nfl_def_stats(wb)
-    # DVOA rankings from footballoutsiders.com
-    dvoa_dict = get_dvoa_rankings(wb)
-    # OL/DL rankings from footballoutsiders.com
-    line_dict = get_line_rankings(wb)
-    # QB rankings from footballoutsiders.com
-    qb_dict = get_qb_stats_FO(wb)
+    # build from whatever is cached and refresh stale sources in the background
+    # (set either way, so an earlier main() in this process doesn't carry over)
+    fetch.STALE_WHILE_REVALIDATE = stale_while_revalidate
+
+    # give up on slow sites after deadline seconds
+    fetch.set_deadline(deadline)
+
+    # report how much memory each source takes to parse (this run only)
+    fetch.TRACE_MEMORY = trace_memory
+    fetch.clear_parse_peaks()
+
+    # never evict this slate's sources from the cache while they are read
+    fetch.keep_sources(get_sources())
+    try:
+        # fetch every missing source in parallel before parsing anything
+        if fetch_backend == "asyncio":
+            async_fetch.prefetch(get_sources())
+        else:
+            prefetch(get_sources())
+
+        # fall back on the archive for anything we couldn't fetch in time
+        archive.restore_missing(get_sources())
+
+        # keep a copy of this build's inputs
+        archive.snapshot(get_sources(), SEASON, WEEK)
+        ages = source_ages(get_sources())
+
+        # parse the html pages on every core; the get_* calls below reuse them
+        parse_sources(SOURCES.values())
+
+        # pull positional stats from fantasypros.com
+        # (required, unlike the sources below: players are listed by their ECR,
+        # so the build fails without it rather than leave out every player)
+        ecr_pos_dict = {}
+        # for position in ['QB', 'RB', 'WR', 'TE', 'DST']:
+        for position in ["QB", "RB", "WR", "TE", "DST"]:
+            ecr_pos_dict[position] = get_fpros_ecr(position)
+
+        # check if Fantasy Draft salary sheet exists
+        if path.exists(fdraft_csv):
+            fdraft_dict = read_fantasy_draft_csv(fdraft_csv)
+        else:
+            fdraft_dict = None
+
+        # sources that could not be loaded are left out (and marked in the sheet)
+        missing = []
+
+        # vegas lines from rotogrinders.com
+        vegas_dict = try_source(missing, "vegas", get_vegas_rg, wb)
+        # get snaps, targets, receptions, rush attempts from lineups.com
+        stats_dict = get_lineups_player_stats(missing)
+        # defense stats from lineups.com
+        def_dict = try_source(missing, "def_stats", get_nfl_def_stats, wb)
+        # DVOA rankings from footballoutsiders.com
+        dvoa_dict = try_source(missing, "dvoa", get_dvoa_rankings, wb)
+        # OL/DL rankings from footballoutsiders.com
+        line_dict = try_source(missing, "line", get_line_rankings, wb)
+        # QB rankings from footballoutsiders.com
+        qb_dict = try_source(missing, "qb", get_qb_stats_FO, wb)
+    finally:
+        fetch.release_sources(get_sources())
 
     # print(dvoa_dict['CHI'])
 
@@ -1544,23 +1565,21 @@ def main():
 
                 # set vegas fields based on team abbv (key)
                 p.set_vegas_fields(
-                    vegas_dict[team_abbv]["overunder"],
-                    vegas_dict[team_abbv]["line"],
-                    vegas_dict[team_abbv]["projected"],
+                    lookup(vegas_dict, team_abbv, "overunder"),
+                    lookup(vegas_dict, team_abbv, "line"),
+                    lookup(vegas_dict, team_abbv, "projected"),
                 )
 
                 if position == "QB":
                     qb = QB(p)
 
-                    # convert string ('3.8%') to float (0.038)
-                    line_sack_rate = line_dict["ol"]["pass"][team_abbv][
-                        "adj_sack_rate"
-                    ].replace("%", "")
-                    opp_sack_rate = line_dict["dl"]["pass"][p.opponent][
-                        "adj_sack_rate"
-                    ].replace("%", "")
-                    qb.line_sack_rate = float(line_sack_rate) / 100
-                    qb.opp_sack_rate = float(opp_sack_rate) / 100
+                    # sack rates are parsed as fractions ('3.8%' is 0.038)
+                    qb.line_sack_rate = lookup(
+                        line_dict, "ol", "pass", team_abbv, "adj_sack_rate"
+                    )
+                    qb.opp_sack_rate = lookup(
+                        line_dict, "dl", "pass", p.opponent, "adj_sack_rate"
+                    )
 
                     # check for QB in qb_dict
                     if name in qb_dict:
@@ -1572,7 +1591,9 @@ def main():
 
                     # check for opponent in def_dict
                     if p.opponent in def_dict:
-                        qb.pass_def_rank = dvoa_dict[p.opponent]["pass_def_rank"]
+                        qb.pass_def_rank = lookup(
+                            dvoa_dict, p.opponent, "pass_def_rank"
+                        )
                         qb.opp_yds_att = def_dict[p.opponent]["pass_yd_per_att"]
                         qb.opp_comp_perc = def_dict[p.opponent]["compl_perc"]
                         qb.opp_td_perc = def_dict[p.opponent]["pass_td_per_att_perc"]
@@ -1584,31 +1605,37 @@ def main():
                     rb = RB(p)
 
                     # set position-specific dvoa fields
-                    rb.run_dvoa = dvoa_dict[p.opponent]["rush_def_rank"]
-                    rb.rb_pass_dvoa = dvoa_dict[p.opponent]["rb_rank"]
+                    rb.run_dvoa = lookup(dvoa_dict, p.opponent, "rush_def_rank")
+                    rb.rb_pass_dvoa = lookup(dvoa_dict, p.opponent, "rb_rank")
 
                     # set oline/opponent dline stats for adjusted line yards
-                    rb.oline_adj_line_yds = line_dict["ol"]["run"][team_abbv][
-                        "adj_line_yds"
-                    ]
-                    rb.opp_adj_line_yds = line_dict["dl"]["run"][p.opponent][
-                        "adj_line_yds"
-                    ]
+                    rb.oline_adj_line_yds = lookup(
+                        line_dict, "ol", "run", team_abbv, "adj_line_yds"
+                    )
+                    rb.opp_adj_line_yds = lookup(
+                        line_dict, "dl", "run", p.opponent, "adj_line_yds"
+                    )
 
                     if name in stats_dict["snaps"]:
                         # set season numbers
                         rb.season_snap_percent = stats_dict["snaps"][name][
                             "season_snap_percent"
                         ]
-                        rb.season_rush_atts = stats_dict["rush_atts"][name]["average"]
-                        rb.season_targets = stats_dict["targets"][name]["average"]
+                        rb.season_rush_atts = lookup(
+                            stats_dict, "rush_atts", name, "average"
+                        )
+                        rb.season_targets = lookup(
+                            stats_dict, "targets", name, "average"
+                        )
 
                         # store lists in Player object
                         rb.snap_percentage_by_week = stats_dict["snaps"][name][
                             "snap_percentage_by_week"
                         ]
-                        rb.rush_atts_weeks = stats_dict["rush_atts"][name]["weeks"]
-                        rb.targets_weeks = stats_dict["targets"][name]["weeks"]
+                        rb.rush_atts_weeks = lookup(
+                            stats_dict, "rush_atts", name, "weeks"
+                        )
+                        rb.targets_weeks = lookup(stats_dict, "targets", name, "weeks")
 
                         # currently need a class method here to calculate/set last weeks snaps/etc stats
                         rb.set_last_week_fields()
@@ -1668,9 +1695,9 @@ def main():
                 elif position == "WR":
                     wr = WR(p)
                     # set position-specific dvoa fields
-                    wr.pass_def_rank = dvoa_dict[p.opponent]["pass_def_rank"]
-                    wr.wr1_rank = dvoa_dict[p.opponent]["wr1_rank"]
-                    wr.wr2_rank = dvoa_dict[p.opponent]["wr2_rank"]
+                    wr.pass_def_rank = lookup(dvoa_dict, p.opponent, "pass_def_rank")
+                    wr.wr1_rank = lookup(dvoa_dict, p.opponent, "wr1_rank")
+                    wr.wr2_rank = lookup(dvoa_dict, p.opponent, "wr2_rank")
 
                     # if player is not in snaps, he likely has no other information either
                     if name in stats_dict["snaps"]:
@@ -1678,15 +1705,21 @@ def main():
                         wr.season_snap_percent = stats_dict["snaps"][name][
                             "season_snap_percent"
                         ]
-                        wr.season_targets = stats_dict["targets"][name]["average"]
-                        wr.season_recepts = stats_dict["receptions"][name]["average"]
+                        wr.season_targets = lookup(
+                            stats_dict, "targets", name, "average"
+                        )
+                        wr.season_recepts = lookup(
+                            stats_dict, "receptions", name, "average"
+                        )
 
                         # store lists in Player object
                         wr.snap_percentage_by_week = stats_dict["snaps"][name][
                             "snap_percentage_by_week"
                         ]
-                        wr.recepts_weeks = stats_dict["receptions"][name]["weeks"]
-                        wr.targets_weeks = stats_dict["targets"][name]["weeks"]
+                        wr.recepts_weeks = lookup(
+                            stats_dict, "receptions", name, "weeks"
+                        )
+                        wr.targets_weeks = lookup(stats_dict, "targets", name, "weeks")
 
                         # call class method to set fields for last week
                         wr.set_last_week_fields()
@@ -1744,22 +1777,28 @@ def main():
                 elif position == "TE":
                     te = TE(p)
                     # set position-specific dvoa fields
-                    te.pass_def_rank = dvoa_dict[p.opponent]["pass_def_rank"]
-                    te.te_rank = dvoa_dict[p.opponent]["te_rank"]
+                    te.pass_def_rank = lookup(dvoa_dict, p.opponent, "pass_def_rank")
+                    te.te_rank = lookup(dvoa_dict, p.opponent, "te_rank")
 
                     if name in stats_dict["snaps"]:
                         # set season numbers
                         te.season_snap_percent = stats_dict["snaps"][name][
                             "season_snap_percent"
                         ]
-                        te.season_targets = stats_dict["targets"][name]["average"]
-                        te.season_recepts = stats_dict["receptions"][name]["average"]
+                        te.season_targets = lookup(
+                            stats_dict, "targets", name, "average"
+                        )
+                        te.season_recepts = lookup(
+                            stats_dict, "receptions", name, "average"
+                        )
 
                         te.snap_percentage_by_week = stats_dict["snaps"][name][
                             "snap_percentage_by_week"
                         ]
-                        te.recepts_weeks = stats_dict["receptions"][name]["weeks"]
-                        te.targets_weeks = stats_dict["targets"][name]["weeks"]
+                        te.recepts_weeks = lookup(
+                            stats_dict, "receptions", name, "weeks"
+                        )
+                        te.targets_weeks = lookup(stats_dict, "targets", name, "weeks")
 
                         # call class method to set fields for last week
                         te.set_last_week_fields()
@@ -1841,6 +1880,8 @@ def main():
     excel_apply_borders(wb)
     excel_apply_hide_columns(wb)
     excel_apply_filter_setup(wb)
+    excel_mark_missing_columns(wb, missing)
+    excel_write_source_ages(wb, ages, fetch.parse_peaks())
     excel_apply_sheet_order(wb)
 
     # save workbook (.xlsx file)
@@ -0,0 +1,276 @@
+"""Local stand-in for every site the sheets pull from, for load testing.
+
+Serves recorded copies of the lineups.com, FantasyPros, FootballOutsiders
+and RotoGrinders endpoints at http://host:port/<site host>/<path>, with
+configurable latency, bandwidth, error rate and bursts of 429s per site.
+Point the fetch layer at it with fetch.BASE_URL (or DFS_BASE_URL):
+
+    python stub_server.py --sources sources --latency 0.2 --error-rate 0.05
+    DFS_BASE_URL=http://localhost:8000 python player_dfs_sheet.py
+
+Fixtures come from a cassette (see cassette.py) or from the manifests of
+an existing sources directory. tests/fixtures/week11.json is a small
+recorded set covering every source of player_dfs_sheet:
+
+    python stub_server.py --cassette tests/fixtures/week11.json
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os import path
+from urllib.parse import urlparse
+
+import cassette
+import fetch
+
+# hop-by-hop/encoding headers that don't apply to the bodies we serve
+SKIP_HEADERS = {"connection", "content-encoding", "content-length", "transfer-encoding"}
+
+
+class Route:
+    """Behaviour of the stub for one site.
+
+    latency is seconds before the response starts, bandwidth caps the body
+    at that many bytes per second, error_rate is the chance of a 503, and
+    every burst_every requests the next burst_length get a 429 asking the
+    client to retry after retry_after seconds.
+    """
+
+    def __init__(
+        self,
+        latency=0.0,
+        bandwidth=None,
+        error_rate=0.0,
+        burst_every=0,
+        burst_length=0,
+        retry_after=1,
+    ):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.burst_every = burst_every
+        self.burst_length = burst_length
+        self.retry_after = retry_after
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return "Route(latency={}, bandwidth={}, error_rate={})".format(
+            self.latency, self.bandwidth, self.error_rate
+        )
+
+    def throttled(self):
+        """Count a request and return True if it falls in a 429 burst."""
+        with self.lock:
+            self.requests += 1
+            count = self.requests
+        if not self.burst_every:
+            return False
+        return (count - 1) % (self.burst_every + self.burst_length) >= self.burst_every
+
+
+def fixture_key(url):
+    """Return the host/path?query a URL is served under."""
+    url = urlparse(url)
+    key = url.netloc + url.path
+    return key + "?" + url.query if url.query else key
+
+
+def fixture(body, headers=None):
+    """Return a fixture for body, with an ETag so revalidation can 304."""
+    data = body.encode("utf-8")
+    headers = {
+        k: v for k, v in (headers or {}).items() if k.lower() not in SKIP_HEADERS
+    }
+    headers["ETag"] = '"{}"'.format(hashlib.sha256(data).hexdigest()[:16])
+    return {"body": data, "headers": headers}
+
+
+def fixtures_from_cassette(filename):
+    """Load the last successful response per URL from a cassette."""
+    fixtures = {}
+    for interaction in cassette.load(filename):
+        if interaction["status"] == 200:
+            fixtures[fixture_key(interaction["url"])] = fixture(
+                interaction["body"], interaction["headers"]
+            )
+    return fixtures
+
+
+def fixtures_from_sources(directory="sources", sources=()):
+    """Load cached sources from directory.
+
+    Files are matched to their URL by their manifest, or by sources, a
+    list of (filename, endpoint, ttl) such as player_dfs_sheet.get_sources().
+    """
+    urls = {fn: url for fn, url, _ in sources}
+    for meta_file in glob.glob(path.join(directory, "*.meta.json")):
+        filename = meta_file[: -len(".meta.json")]
+        urls[filename] = fetch.read_manifest(filename).get("url")
+
+    fixtures = {}
+    for filename, url in urls.items():
+        if url and fetch.is_cached(filename):
+            content_type = "application/json" if ".json" in filename else "text/html"
+            fixtures[fixture_key(url)] = fixture(
+                fetch.read_cache(filename), {"Content-Type": content_type}
+            )
+    return fixtures
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        stub = self.server.stub
+        key = self.path.lstrip("/")
+        route = stub.route(key)
+
+        time.sleep(route.latency)
+
+        if route.throttled():
+            self.send_response(429)
+            self.send_header("Retry-After", str(route.retry_after))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if random.random() < route.error_rate:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        item = stub.fixtures.get(key)
+        if item is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if self.headers.get("If-None-Match") == item["headers"]["ETag"]:
+            self.send_response(304)
+            self.send_header("ETag", item["headers"]["ETag"])
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        for name, value in item["headers"].items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(item["body"])))
+        self.end_headers()
+        self.write_body(item["body"], route.bandwidth)
+
+    def write_body(self, body, bandwidth):
+        """Write body, no faster than bandwidth bytes per second."""
+        if not bandwidth:
+            self.wfile.write(body)
+            return
+        # send in 10 chunks per second
+        chunk = max(1, int(bandwidth / 10))
+        for start in range(0, len(body), chunk):
+            self.wfile.write(body[start : start + chunk])
+            time.sleep(0.1)
+
+    def log_message(self, format, *args):
+        if self.server.stub.verbose:
+            super().log_message(format, *args)
+
+
+class StubServer:
+    """Serve fixtures ({host/path?query: fixture}) with per-site routes.
+
+    routes maps a site host (e.g. "www.fantasypros.com") to its Route;
+    sites without one use default.
+    """
+
+    def __init__(self, fixtures, routes=None, default=None, verbose=False):
+        self.fixtures = fixtures
+        self.routes = routes or {}
+        self.default = default or Route()
+        self.verbose = verbose
+
+    def __repr__(self):
+        return "StubServer({} fixtures)".format(len(self.fixtures))
+
+    def route(self, key):
+        return self.routes.get(key.split("/", 1)[0], self.default)
+
+    def make_server(self, host="127.0.0.1", port=8000):
+        server = ThreadingHTTPServer((host, port), StubHandler)
+        server.daemon_threads = True
+        server.stub = self
+        return server
+
+    @contextmanager
+    def running(self, host="127.0.0.1", port=0):
+        """Serve in a background thread and point fetch at the server."""
+        server = self.make_server(host, port)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+
+        previous = fetch.BASE_URL
+        fetch.BASE_URL = "http://{}:{}".format(*server.server_address)
+        try:
+            yield fetch.BASE_URL
+        finally:
+            fetch.BASE_URL = previous
+            server.shutdown()
+            server.server_close()
+
+
+def load_routes(filename):
+    """Load {site host: Route keyword arguments} from a JSON file."""
+    with open(filename, "r") as json_file:
+        return {host: Route(**kwargs) for host, kwargs in json.load(json_file).items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve source fixtures locally.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--cassette", help="serve the responses in a cassette")
+    parser.add_argument("--sources", default="sources", help="serve a cache dir")
+    parser.add_argument("--routes", help="JSON file of per-site settings")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--bandwidth", type=int, help="bytes per second")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--burst-every", type=int, default=0)
+    parser.add_argument("--burst-length", type=int, default=0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    if args.cassette:
+        fixtures = fixtures_from_cassette(args.cassette)
+    else:
+        from player_dfs_sheet import get_sources
+
+        fixtures = fixtures_from_sources(args.sources, get_sources())
+    default = Route(
+        args.latency,
+        args.bandwidth,
+        args.error_rate,
+        args.burst_every,
+        args.burst_length,
+        args.retry_after,
+    )
+    routes = load_routes(args.routes) if args.routes else {}
+
+    stub = StubServer(fixtures, routes, default, args.verbose)
+    server = stub.make_server(args.host, args.port)
+    print(
+        "Stub: serving {} fixtures on http://{}:{}".format(
+            len(fixtures), args.host, args.port
+        )
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
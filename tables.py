@@ -0,0 +1,153 @@
+"""Extract html tables into rows or keyed records from a declarative spec.
+
+The scrapers all read tables the same way: every <tr> that has <td>s is
+a row, each cell is its stripped text, one cell is popped as the row's
+key and the rest are zipped with column names. A TableSpec describes
+that once per table (key column, column names, converters, row filter)
+so the column names and converters are worked out when the spec is made
+instead of on every row.
+
+    RUN = TableSpec(["rank", "adj_line_yds"], key=1, convert=number)
+    RUN.extract(soup.find("table"))  # {"LAR": {"rank": 1, ...}, ...}
+"""
+
+import re
+
+# an optional sign, then digits (grouped in threes by commas, or not)
+NUMBER = re.compile(r"[-+]?((\d{1,3}(,\d{3})+|\d+)(\.\d*)?|\.\d+)")
+
+
+def cell_text(cell):
+    return cell.text.strip()
+
+
+def number(text):
+    """Convert a cell to an int, a float or, for a percent, a fraction.
+
+    "1" is 1, "-12.5" is -12.5, "+3.5" is 3.5, "1,234" is 1234 and "3.8%"
+    is 0.038. Anything else (names, team codes, blanks) is returned
+    unchanged.
+    """
+    percent = text.endswith("%")
+    value = text[:-1].rstrip() if percent else text
+    if not NUMBER.fullmatch(value):
+        return text
+    value = value.replace(",", "")
+    if percent:
+        return float(value) / 100
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def header_rows(table):
+    """Return the text of the <th>s of every row in a table's <thead>."""
+    return [
+        [cell_text(cell) for cell in row.find_all("th")]
+        for row in table.find("thead").find_all("tr")
+    ]
+
+
+class TableSpec:
+    """How to turn the <td> rows of a table into records.
+
+    columns names the cells of a row, in order; like zip, cells past the
+    last name are dropped and names past the last cell are left out. With
+    columns=None a record is the row's list of cells. key is the index of
+    the cell that keys the record, removed before the rest are named
+    (None gives a list of records instead of a dict), and key_func maps
+    it (e.g. to a full name). start is the index of the first remaining
+    cell the columns name; negative counts from the end of the row.
+
+    Cells are read by readers ({index: function of the <td>}) or as their
+    stripped text, then passed through text (e.g. to fix team codes).
+    converters ({column: function}) convert named values, and convert
+    (e.g. number) every other value; the key is never converted. Rows
+    that keep(cells) is false for are skipped.
+    """
+
+    def __init__(
+        self,
+        columns=None,
+        key=None,
+        start=0,
+        text=None,
+        readers=None,
+        converters=None,
+        convert=None,
+        keep=None,
+        key_func=None,
+    ):
+        self.columns = columns
+        self.key = key
+        self.start = start
+        self.text = text
+        self.readers = readers or {}
+        self.converters = converters or {}
+        self.convert = convert
+        self.keep = keep
+        self.key_func = key_func
+
+        # (name, converter or None) per column, so rows don't look them up
+        self.named = None
+        if columns is not None:
+            self.named = [
+                (name, self.converters.get(name, convert)) for name in columns
+            ]
+        self.converting = bool(self.converters) or convert is not None
+
+    def __repr__(self):
+        return "TableSpec(columns={}, key={})".format(self.columns, self.key)
+
+    def read_rows(self, table):
+        """Return the cells of every row of table that has <td>s."""
+        readers = self.readers
+        text = self.text
+        rows = []
+        for row in table.find_all("tr"):
+            tds = row.find_all("td")
+            if not tds:
+                continue
+            if readers:
+                cells = [readers.get(i, cell_text)(td) for i, td in enumerate(tds)]
+            else:
+                cells = [td.text.strip() for td in tds]
+            if text is not None:
+                cells = [text(cell) for cell in cells]
+            rows.append(cells)
+        return rows
+
+    def record(self, values):
+        if self.start:
+            values = values[self.start :]
+        if self.named is None:
+            if self.convert is None:
+                return values
+            return [self.convert(value) for value in values]
+        if not self.converting:
+            return dict(zip(self.columns, values))
+        return {
+            name: value if convert is None else convert(value)
+            for (name, convert), value in zip(self.named, values)
+        }
+
+    def build(self, rows):
+        """Turn rows (lists of cells, see read_rows) into records."""
+        keyed = self.key is not None
+        records = {} if keyed else []
+        for cells in rows:
+            if self.keep is not None and not self.keep(cells):
+                continue
+            if not keyed:
+                records.append(self.record(cells))
+                continue
+            key = cells[self.key]
+            if self.key_func is not None:
+                key = self.key_func(key)
+            records[key] = self.record(cells[: self.key] + cells[self.key + 1 :])
+        return records
+
+    def extract(self, table):
+        """Read table and return its records."""
+        return self.build(self.read_rows(table))
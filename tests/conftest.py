@@ -0,0 +1,20 @@
+import sys
+from os import path
+
+import pytest
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+import fetch  # noqa: E402
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    """Run in an empty working directory with a fresh sources/ cache."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(fetch, "_cache_manager", None)
+    monkeypatch.setattr(fetch, "CACHE_MAX_BYTES", None)
+    fetch.clear_memo()
+    fetch.make_dirs([path.join("sources", "x")])
+    yield "sources"
+    fetch.clear_memo()
@@ -0,0 +1,55 @@
+import itertools
+from os import path
+
+import pytest
+
+import archive
+import fetch
+
+
+@pytest.fixture
+def sources(cache_dir, monkeypatch):
+    # a second apart, so every run index gets its own name
+    clock = itertools.count(1_500_000_000)
+    monkeypatch.setattr(archive.time, "time", lambda: float(next(clock)))
+    entries = []
+    for name in ["a.html", "b.json"]:
+        filename = path.join(cache_dir, name)
+        fetch.write_cache(filename, name)
+        fetch.write_manifest(filename, {"sha256": fetch.checksum(name)})
+        entries.append((filename, "https://example.com/" + name, None))
+    return entries
+
+
+def test_snapshot_skips_unchanged_sources(sources, monkeypatch):
+    first = archive.snapshot(sources, 2018, 11)
+
+    monkeypatch.setattr(fetch, "read_cache", pytest.fail)
+    assert archive.snapshot(sources, 2018, 11) == first
+
+
+def test_snapshot_writes_index_when_a_source_changes(sources):
+    first = archive.snapshot(sources, 2018, 11)
+    filename = sources[0][0]
+    fetch.write_cache(filename, "changed")
+    fetch.write_manifest(filename, {"sha256": fetch.checksum("changed")})
+
+    second = archive.snapshot(sources, 2018, 11)
+    assert second != first
+    assert archive.latest(filename)["hash"] == fetch.checksum("changed")
+    assert archive.load(fetch.checksum("changed")) == "changed"
+
+
+def test_eviction_leaves_the_archive_alone(sources, monkeypatch):
+    index_file = archive.snapshot(sources, 2018, 11)
+
+    # every entry is over this cap, so indexing the cache evicts them all
+    monkeypatch.setattr(fetch, "CACHE_MAX_BYTES", 1)
+    manager = fetch.get_cache_manager()
+    assert not any(fetch.is_cached(filename) for filename, _, _ in sources)
+    assert not any("archive" in key for key in manager.entries)
+
+    monkeypatch.setattr(fetch, "_cache_manager", None)
+    monkeypatch.setattr(fetch, "CACHE_MAX_BYTES", None)
+    archive.restore(index_file)
+    assert [fetch.read_cache(fn) for fn, _, _ in sources] == ["a.html", "b.json"]
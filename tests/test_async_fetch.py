@@ -0,0 +1,50 @@
+import asyncio
+from os import path
+
+import pytest
+
+import async_fetch
+import fetch
+
+
+@pytest.fixture
+def stale(cache_dir, monkeypatch):
+    monkeypatch.setattr(fetch, "_deadline", None)
+    filename = path.join(cache_dir, "page.html")
+    fetch.write_cache(filename, "cached")
+    return filename
+
+
+def test_ensure_cached_uses_cache_past_deadline(stale, monkeypatch):
+    monkeypatch.setattr(fetch, "fill", pytest.fail)
+    fetch.set_deadline(0)
+
+    asyncio.run(
+        async_fetch.AsyncFetcher().ensure_cached(stale, "https://example.com", ttl=-1)
+    )
+    assert fetch.read_cache(stale) == "cached"
+
+
+def test_ensure_cached_falls_back_when_deadline_hits(stale, monkeypatch):
+    def fill(filename, endpoint):
+        raise fetch.DeadlineExceeded("No time left")
+
+    monkeypatch.setattr(fetch, "fill", fill)
+    asyncio.run(
+        async_fetch.AsyncFetcher().ensure_cached(stale, "https://example.com", ttl=-1)
+    )
+    assert fetch.read_cache(stale) == "cached"
+
+
+def test_prefetch_from_a_running_loop(stale, monkeypatch):
+    filled = []
+    monkeypatch.setattr(fetch, "fill", lambda fn, url: filled.append(fn))
+    sources = [(stale, "https://example.com", -1)]
+
+    async def tooling():
+        # blocking callers on a running loop, and async ones
+        async_fetch.prefetch(sources)
+        await async_fetch.prefetch_async(sources)
+
+    asyncio.run(tooling())
+    assert filled == [stale, stale]
@@ -0,0 +1,90 @@
+import os
+from os import path
+
+import pytest
+
+import fetch
+from cache_manager import CacheManager
+
+
+@pytest.fixture
+def index_file(tmp_path):
+    return str(tmp_path / ".cache_index")
+
+
+def manager(index_file, removed, max_bytes=100):
+    # each manager stands in for another process sharing the index
+    return CacheManager(
+        index_file,
+        max_bytes,
+        remove=removed.append,
+        lock=lambda: fetch.cache_lock(index_file, give_up=False),
+    )
+
+
+def test_evicts_on_totals_from_every_process(index_file):
+    removed = []
+    first, second = manager(index_file, removed), manager(index_file, removed)
+    first.touch("a", 60)
+    second.touch("b", 60)
+
+    assert removed == ["a"]
+    assert first.touch("b") == []
+    assert first.total == second.total == 60
+
+
+def test_compaction_keeps_other_processes_entries(index_file):
+    removed = []
+    first, second = manager(index_file, removed, None), manager(index_file, removed)
+    first.touch("a", 10)
+    second.touch("b", 20)
+    first.compact()
+    second.touch("c", 30)
+    second.compact()
+
+    reloaded = manager(index_file, removed)
+    assert sorted(reloaded.entries) == ["a", "b", "c"]
+    assert reloaded.total == 60
+    # the first process catches up on its next access
+    first.touch("a")
+    assert first.total == 60
+    assert sorted(os.listdir(path.dirname(index_file))) == [".cache_index"]
+
+
+def test_partial_line_is_compacted_away(index_file):
+    removed = []
+    first = manager(index_file, removed)
+    first.touch("a", 10)
+    with open(index_file, "a") as outfile:
+        outfile.write("T 20 1.0 b")
+
+    second = manager(index_file, removed)
+    second.touch("c", 30)
+    assert sorted(manager(index_file, removed).entries) == ["a", "c"]
+
+
+def test_cache_lock_removes_its_file(tmp_path):
+    filename = str(tmp_path / "page.html")
+    with fetch.cache_lock(filename):
+        assert path.isfile(filename + ".lock")
+    assert not path.isfile(filename + ".lock")
+
+
+def test_cache_lock_retakes_a_removed_file(tmp_path, monkeypatch):
+    filename = str(tmp_path / "page.html")
+    # a waiter that opened the lock file just before its holder removed it
+    stale = open(filename + ".lock", "a")
+    os.remove(filename + ".lock")
+    opened = []
+    real_open = open
+
+    def first_open_is_stale(name, *args, **kwargs):
+        if not opened:
+            opened.append(name)
+            return stale
+        return real_open(name, *args, **kwargs)
+
+    monkeypatch.setattr("builtins.open", first_open_is_stale)
+    with fetch.cache_lock(filename):
+        assert path.isfile(filename + ".lock")
+    assert stale.closed
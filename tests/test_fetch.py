@@ -0,0 +1,196 @@
+import os
+import subprocess
+import sys
+import tracemalloc
+from os import path
+
+import pytest
+import requests
+from bs4 import BeautifulSoup
+
+import fetch
+import parser_parity
+from stub_server import StubServer, fixture
+
+CRLF_PAGE = (
+    "<html>\r\n<body>\r\n<table><tr><td>1</td></tr></table>\r\n</body>\r\n</html>\r"
+)
+
+
+@pytest.mark.parametrize("compression", ["gzip", "lzma", None])
+def test_crlf_round_trip(cache_dir, monkeypatch, compression):
+    monkeypatch.setattr(fetch, "COMPRESSION", compression)
+    filename = path.join(cache_dir, "page.html")
+    fetch.write_cache(filename, CRLF_PAGE)
+    fetch.write_manifest(filename, {"sha256": fetch.checksum(CRLF_PAGE)})
+
+    assert fetch.read_cache(filename) == CRLF_PAGE
+    assert fetch.read_verified(filename) == CRLF_PAGE
+
+
+def test_crlf_fill_from_server(cache_dir):
+    url = "https://example.com/page"
+    fixtures = {
+        "example.com/page": fixture(
+            CRLF_PAGE, {"Content-Type": "text/html; charset=utf-8"}
+        )
+    }
+    filename = path.join(cache_dir, "page.html")
+    with StubServer(fixtures).running():
+        assert fetch.fill(filename, url)
+
+    assert fetch.read_manifest(filename)["sha256"] == fetch.checksum(CRLF_PAGE)
+    assert fetch.read_verified(filename) == CRLF_PAGE
+
+
+def test_refresh_cache_fills_under_lock(cache_dir, monkeypatch):
+    filename = path.join(cache_dir, "page.html")
+    fetch.write_cache(filename, "old")
+    fetch.write_manifest(filename, {"url": "https://example.com/page"})
+
+    filled = []
+    monkeypatch.setattr(fetch, "fill", lambda fn, url: filled.append(fn) or True)
+    assert fetch.refresh_cache(cache_dir) == 1
+    assert filled == [filename]
+
+
+class ThrottledSession:
+    """Answer every request with a 429 asking to retry after retry_after."""
+
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        self.requests = 0
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests += 1
+        response = requests.Response()
+        response.status_code = 429
+        response.headers["Retry-After"] = self.retry_after
+        return response
+
+
+@pytest.mark.parametrize("value", ["3600", "Fri, 01 Jan 2100 00:00:00 GMT"])
+def test_long_retry_after_gives_up(monkeypatch, value):
+    session = ThrottledSession(value)
+    monkeypatch.setattr(fetch, "get_session", lambda: session)
+    monkeypatch.setattr(fetch, "_buckets", {})
+    monkeypatch.setattr(fetch.time, "sleep", pytest.fail)
+
+    response = fetch.get("https://throttled.example.com/page")
+    assert response.status_code == 429
+    assert session.requests == 1
+    assert fetch.get_bucket("https://throttled.example.com/page").tokens >= 1
+
+
+def test_parse_source_memo_hit(cache_dir):
+    calls = []
+    source = fetch.Source(
+        "https://example.com/{week}",
+        "page_{week}.html",
+        lambda soup, params: calls.append(params) or soup.td.text,
+        params=[{"week": 11}],
+    )
+    filename = source.cache_file(cache_dir, week=11)
+    fetch.write_cache(filename, CRLF_PAGE)
+
+    assert fetch.parse_source(source, filename, {"week": 11}) == "1"
+    # a second lookup comes from memory, without even reading the artifact
+    os.remove(fetch.artifact_path(filename))
+    assert fetch.parse_source(source, filename, {"week": 11}) == "1"
+    assert not path.isfile(fetch.artifact_path(filename))
+    assert len(calls) == 1
+
+
+def test_run_parser_stops_tracing_it_started(cache_dir):
+    source = fetch.Source(
+        "https://example.com/page", "page.html", lambda soup, params: soup.td.text
+    )
+    filename = source.cache_file(cache_dir)
+    fetch.write_cache(filename, CRLF_PAGE)
+
+    result, peak = fetch.run_parser(source, filename, {}, trace=True)
+    assert result == "1"
+    assert peak > 0
+    assert not tracemalloc.is_tracing()
+
+    # but leaves running whatever tracing someone else started
+    tracemalloc.start()
+    try:
+        fetch.run_parser(source, filename, {}, trace=True)
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+
+UNGUARDED_SCRIPT = """
+import sys
+sys.path.insert(0, {root!r})
+import fetch
+
+def first_cell(soup, params):
+    return soup.td.text
+
+source = fetch.Source("https://example.com/page", "page.html", first_cell)
+fetch.write_cache(source.cache_file("."), "<table><tr><td>1</td></tr></table>")
+print(fetch.parse_sources([source], "."))
+"""
+
+
+def test_parse_sources_from_unguarded_script(tmp_path):
+    # workers would run this script again, so it must be parsed in process
+    script = tmp_path / "build.py"
+    root = path.dirname(path.dirname(path.abspath(__file__)))
+    script.write_text(UNGUARDED_SCRIPT.format(root=root))
+    done = subprocess.run(
+        [sys.executable, str(script)],
+        cwd=tmp_path,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert done.returncode == 0, done.stderr
+    assert "parsing in process" in done.stdout
+    assert done.stdout.splitlines()[-1] == "1"
+
+
+TABLES_PAGE = """<html><body>
+<!-- <table id="old"><tr><td>commented out</td></tr></table> -->
+<script>var t = "<table id='js'>";</script>
+<div data-template="<table id='attr'>"></div>
+<table id="outer">
+<tr><td>outer</td><td>
+<table id="inner"><tr><td>inner</td></tr></table>
+</td></tr>
+<tr><td>after inner</td></tr>
+</table>
+<TABLE id="last"><tr><td>last</td></tr></TABLE>
+</body></html>"""
+
+
+def test_split_tables_matches_find_all():
+    fragments = fetch.split_tables(TABLES_PAGE)
+    tables = BeautifulSoup(TABLES_PAGE, "html5lib").find_all("table")
+
+    assert [t["id"] for t in tables] == ["outer", "inner", "last"]
+    assert len(fragments) == len(tables)
+    for fragment, table in zip(fragments, tables):
+        soup = BeautifulSoup(fragment, "html5lib")
+        assert soup.find("table")["id"] == table["id"]
+        assert soup.find("table").get_text() == table.get_text()
+
+
+def test_parse_tables_matches_reference(cache_dir):
+    source = fetch.Source(
+        "https://example.com/tables",
+        "tables.html",
+        lambda tables, params: tables,
+        kind="tables",
+        tables=[lambda table: table.get_text(" ", strip=True)] * 3,
+    )
+    filename = source.cache_file(cache_dir)
+    fetch.write_cache(filename, TABLES_PAGE)
+
+    expected = parser_parity.parse_reference(source, TABLES_PAGE, {})
+    assert fetch.parse_tables(source, filename, {}) == expected
+    # and again from the saved per-table results
+    assert fetch.parse_tables(source, filename, {}) == expected
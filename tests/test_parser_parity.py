@@ -0,0 +1,76 @@
+import shutil
+from os import path
+
+import pytest
+
+import fetch
+import parser_parity
+from dfs_sheet import SOUP_PAGES
+from player_dfs_sheet import SOURCES
+
+FIXTURES = path.join(path.dirname(path.abspath(__file__)), "fixtures")
+
+# cache file of each source page: the fixture standing in for it
+PAGES = {
+    "ecr_{}.html".format(pos): "ecr.html" for pos in ["QB", "RB", "WR", "TE", "DST"]
+}
+PAGES.update(
+    {
+        "html_defense.html": "teamdef.html",
+        "html_ol.html": "ol.html",
+        "html_dl.html": "dl.html",
+        "html_oline.html": "ol.html",
+        "html_dline.html": "dl.html",
+        "html_qb.html": "qb.html",
+        "vegas_script.html": "ows.html",
+    }
+)
+
+
+@pytest.fixture
+def pages(cache_dir):
+    for filename, fixture in PAGES.items():
+        shutil.copy(path.join(FIXTURES, fixture), path.join(cache_dir, filename))
+    return cache_dir
+
+
+def test_sources_match_reference(pages):
+    mismatches, _ = parser_parity.check(SOURCES, ["lxml"], directory=pages)
+    assert mismatches == {"lxml": []}
+
+
+def test_dfs_sheet_pages_match_reference(pages):
+    mismatches, _ = parser_parity.check_sheets(SOUP_PAGES, ["lxml"])
+    assert mismatches == {"lxml": []}
+
+
+def test_html_parser_differs_on_unclosed_cells(pages):
+    # the last ECR row leaves out its </td>s, so html.parser nests the cells
+    mismatches, _ = parser_parity.check(SOURCES, ["html.parser"], directory=pages)
+    assert path.join(pages, "ecr_QB.html") in mismatches["html.parser"]
+
+
+def test_fixtures_are_read(pages):
+    # the checks above mean nothing if the extractors find no rows
+    ecr = fetch.parse_payload(
+        SOURCES["ecr"], path.join(pages, "ecr_QB.html"), {"position": "QB"}
+    )
+    assert ecr[2][2] == "TJ Yeldon JAX"
+    for _, func, args in SOUP_PAGES:
+        sheets = parser_parity.fill_sheets(func, args, "lxml")
+        assert any(len(rows) > 1 for rows in sheets.values())
+
+
+def test_parse_sources_in_worker_processes(pages):
+    assert fetch.PARSE_START_METHOD != "fork"
+    assert fetch.main_is_guarded()
+    assert fetch.parse_sources(SOURCES.values(), pages, max_workers=2) == 9
+
+    for source in SOURCES.values():
+        if source.kind not in ("html", "tables"):
+            continue
+        for params in source.params:
+            filename = source.cache_file(pages, **params)
+            found, result = fetch.find_parsed(source, filename, params)
+            assert found
+            assert result == fetch.parse_payload(source, filename, params)
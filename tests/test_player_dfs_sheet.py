@@ -0,0 +1,71 @@
+import shutil
+from os import path
+
+import pytest
+from openpyxl import load_workbook
+
+import fetch
+import player_dfs_sheet
+from stub_server import Route, StubServer, fixtures_from_cassette
+
+TESTS = path.dirname(path.abspath(__file__))
+
+# every endpoint player_dfs_sheet reads, recorded for week 11 of 2018
+CASSETTE = path.join(TESTS, "fixtures", "week11.json")
+
+
+@pytest.fixture
+def slate(cache_dir):
+    shutil.copy(path.join(path.dirname(TESTS), "DKSalaries_week11_full.csv"), ".")
+    yield fixtures_from_cassette(CASSETTE)
+    fetch.set_deadline(None)
+
+
+def names(ws):
+    return [row[1] for row in ws.iter_rows(min_row=3, values_only=True)]
+
+
+def test_build_through_stub_server(slate):
+    with StubServer(slate).running():
+        player_dfs_sheet.main()
+
+    wb = load_workbook("player_sheet.xlsx")
+    assert "Drew Brees" in names(wb["QB"])
+    assert "Melvin Gordon" in names(wb["RB"])
+    assert "Michael Thomas" in names(wb["WR"])
+    assert "Zach Ertz" in names(wb["TE"])
+    assert "LAC" in names(wb["DST"])
+
+    stale = [row[4] for row in wb["SOURCES"].iter_rows(min_row=2, values_only=True)]
+    assert stale == ["no"] * len(player_dfs_sheet.get_sources())
+
+
+def test_build_past_deadline_marks_missing_columns(slate):
+    # footballoutsiders.com answers too late, so dvoa, line and qb are left
+    # out (the other sites' requests, spaced out per host, take over a second)
+    routes = {"www.footballoutsiders.com": Route(latency=8)}
+    with StubServer(slate, routes).running():
+        player_dfs_sheet.main(deadline=3)
+
+    wb = load_workbook("player_sheet.xlsx")
+    header = {cell.value: cell for cell in wb["QB"][2]}
+    for field, source in [("DYAR", "qb"), ("O-Line Sack%", "line")]:
+        assert header[field].fill.start_color.rgb == "FFFF7C80"
+        assert header[field].comment.text == "Source unavailable: " + source
+    assert header["Total"].comment is None
+    assert "Drew Brees" in names(wb["QB"])
+
+    missing = {
+        row[0]
+        for row in wb["SOURCES"].iter_rows(min_row=2, values_only=True)
+        if row[4] == "missing"
+    }
+    assert missing == {
+        path.join("sources", name)
+        for name in [
+            "html_defense.html",
+            "html_ol.html",
+            "html_dl.html",
+            "html_qb.html",
+        ]
+    }
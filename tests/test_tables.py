@@ -0,0 +1,38 @@
+import pytest
+from bs4 import BeautifulSoup
+
+from dfs_sheet import ROWS_TABLE
+from tables import number
+
+
+@pytest.mark.parametrize(
+    "text, value",
+    [
+        ("1", 1),
+        ("-12.5", -12.5),
+        ("+3.5", 3.5),
+        ("1,234", 1234),
+        ("-1,512", -1512),
+        ("12,345.6", 12345.6),
+        ("3.8%", 0.038),
+        ("+2.5%", 0.025),
+        (".5", 0.5),
+    ],
+)
+def test_number_converts(text, value):
+    assert number(text) == pytest.approx(value)
+    assert type(number(text)) is type(value)
+
+
+@pytest.mark.parametrize("text", ["LAR", "", "-", "1,2", "1,2345", "4/51", "1.2.3"])
+def test_number_leaves_other_text(text):
+    assert number(text) == text
+
+
+def test_rows_table_converts_numbers():
+    table = BeautifulSoup(
+        "<table><tr><th>TEAM</th></tr>"
+        "<tr><td>NO</td><td>1,512</td><td>+3.5</td><td>40.1%</td></tr></table>",
+        "html.parser",
+    ).table
+    assert ROWS_TABLE.extract(table) == [["NO", 1512, 3.5, 0.401]]